@@ -0,0 +1,96 @@
+"""
+Benchmark: full CoA layout per lot vs overlaying lot data on the cached template
+
+Usage: python benchmarks/bench_coa.py [--lots 200]
+"""
+
+import os
+import re
+import sys
+import time
+import zlib
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.coa_generator import CoAGenerator, generate_coa_bytes, get_template
+
+# Position and string of each text run; colour operators vary by draw call
+TEXT_OP = re.compile(rb'BT ([\d.]+ [\d.]+) Td.*?(\(.*?\)) Tj ET')
+
+
+def synthetic_lots(n_lots, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{
+        'batch_id': f"BATCH-{i:05d}",
+        'analysis_date': '2024-05-01',
+        'd9_thc': float(rng.uniform(70, 92)),
+        'd8_thc': float(rng.uniform(0, 5)),
+        'cbd': float(rng.uniform(0, 2)),
+        'cbg': float(rng.uniform(0, 3)),
+        'cbn': float(rng.uniform(0, 4)),
+        'cbc': float(rng.uniform(0, 1))
+    } for i in range(n_lots)]
+
+
+def text_ops(pdf_bytes):
+    """Every (position, string) drawn in the document, in drawing order"""
+    ops = []
+    for stream in re.findall(rb'stream\r?\n(.*?)\r?\nendstream', pdf_bytes, re.S):
+        try:
+            stream = zlib.decompress(stream)
+        except zlib.error:
+            pass
+        ops.extend(TEXT_OP.findall(stream))
+    return ops
+
+
+def timed(render, lots):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for data in lots:
+        render(data)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lots', type=int, default=200)
+    args = parser.parse_args()
+
+    lots = synthetic_lots(args.lots)
+    direct = lambda data: CoAGenerator().generate_coa(data)
+
+    # Template build is a one-off per process; time it separately
+    start = time.perf_counter()
+    get_template()
+    build_s = time.perf_counter() - start
+
+    for data in lots[:5]:
+        assert text_ops(direct(data)) == text_ops(generate_coa_bytes(data)), data['batch_id']
+
+    # Timings without tracemalloc overhead, then a traced pass for peak memory
+    start = time.perf_counter()
+    for data in lots:
+        direct(data)
+    direct_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in lots:
+        generate_coa_bytes(data)
+    template_s = time.perf_counter() - start
+    direct_peak = timed(direct, lots[:20])[1]
+    template_peak = timed(generate_coa_bytes, lots[:20])[1]
+
+    print(f"lots:            {args.lots:,}")
+    print(f"template build:  {build_s * 1e3:>10.2f} ms (once)")
+    print(f"full layout:     {direct_s / args.lots * 1e3:>10.2f} ms/CoA  peak {direct_peak / 1024:,.0f} KiB")
+    print(f"template:        {template_s / args.lots * 1e3:>10.2f} ms/CoA  peak {template_peak / 1024:,.0f} KiB")
+    print(f"speedup:         {direct_s / template_s:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: ExtractionOptimizer single-row latency, sklearn predict vs CompiledForest
+
+Usage: python benchmarks/bench_compiled_forest.py [--rows 5000] [--batch 500]
+"""
+
+import os
+import sys
+import copy
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.prediction_models import ExtractionOptimizer
+from bench_parallel_models import synthetic_batches
+
+
+def latency(func, X, repeats):
+    """Median seconds per call of func on each row of X in turn"""
+    times = []
+    for i in range(repeats):
+        row = X[i % len(X)][None]
+        start = time.perf_counter()
+        func(row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def elapsed(func, X):
+    start = time.perf_counter()
+    func(X)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5_000, help='training rows')
+    parser.add_argument('--batch', type=int, default=500, help='rows per batch call')
+    parser.add_argument('--repeats', type=int, default=2_000)
+    args = parser.parse_args()
+
+    X, y = synthetic_batches(args.rows)
+    X_test, _ = synthetic_batches(max(args.batch, 1_000), seed=1)
+
+    optimizer = ExtractionOptimizer()
+    optimizer.train(X, y)
+    compiled = copy.deepcopy(optimizer)
+    compiled.compiled = True
+
+    start = time.perf_counter()
+    compiled.compiled_forest()
+    compile_s = time.perf_counter() - start
+
+    # Exact parity, row by row and batched
+    batch = X_test[:args.batch]
+    assert np.array_equal(compiled.predict(batch), optimizer.predict(batch))
+    for row in X_test[:100]:
+        assert np.array_equal(compiled.predict(row[None]), optimizer.predict(row[None]))
+
+    sklearn_s = latency(optimizer.predict, X_test, max(args.repeats // 20, 20))
+    compiled_s = latency(compiled.predict, X_test, args.repeats)
+
+    batch_sklearn = min(elapsed(optimizer.predict, batch) for _ in range(3))
+    batch_compiled = min(elapsed(compiled.predict, batch) for _ in range(3))
+
+    forest = compiled.compiled_forest()
+    print(f"trees / nodes / depth:  {forest.n_trees} / {len(forest.value) // 2:,} / {forest.depth}")
+    print(f"compile:                {compile_s * 1e3:>10.1f} ms")
+    print(f"single row, sklearn:    {sklearn_s * 1e6:>10.0f} us")
+    print(f"single row, compiled:   {compiled_s * 1e6:>10.0f} us  ({sklearn_s / compiled_s:.0f}x)")
+    print(f"{args.batch} rows, sklearn:    {batch_sklearn * 1e3:>10.2f} ms")
+    print(f"{args.batch} rows, compiled:   {batch_compiled * 1e3:>10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
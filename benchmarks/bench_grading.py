@@ -0,0 +1,91 @@
+"""
+Benchmark: PotencyClassifier.grade_batch / compliance_batch vs the scalar rules
+
+Usage: python benchmarks/bench_grading.py [--lots 50000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.prediction_models import PotencyClassifier
+
+
+def scalar_grade(total_cannabinoids, degradation_index, isomerization_ratio):
+    """The original one-lot-at-a-time grading rules"""
+    if total_cannabinoids >= 90 and degradation_index < 2 and isomerization_ratio < 3:
+        return 'A', 'Pass'
+    elif total_cannabinoids >= 85 and degradation_index < 3 and isomerization_ratio < 5:
+        return 'B', 'Pass'
+    elif total_cannabinoids >= 80 and degradation_index < 5:
+        return 'C', 'Pass'
+    else:
+        return 'F', 'Fail'
+
+
+def scalar_compliance(cbd_thc_ratio, total_thc):
+    """The original hemp compliance rule"""
+    return (cbd_thc_ratio > 20) and (total_thc < 0.3), cbd_thc_ratio > 20, total_thc < 0.3
+
+
+def synthetic_inventory(n_lots, seed=0):
+    """Lot metrics spread across every grade, including exact threshold values and NaNs"""
+    rng = np.random.default_rng(seed)
+    total = rng.uniform(75, 100, n_lots)
+    degradation = rng.uniform(0, 7, n_lots)
+    isomerization = rng.uniform(0, 12, n_lots)
+    edges = rng.random(n_lots) < 0.1
+    total[edges] = rng.choice([80, 85, 90], edges.sum())
+    degradation[edges] = rng.choice([2, 3, 5], edges.sum())
+    isomerization[edges] = rng.choice([3, 5], edges.sum())
+    degradation[rng.random(n_lots) < 0.001] = np.nan
+    ratio = rng.uniform(0, 40, n_lots)
+    thc = rng.uniform(0, 0.6, n_lots)
+    return total, degradation, isomerization, ratio, thc
+
+
+def best_of(func, repeats=5):
+    elapsed = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lots', type=int, default=50_000)
+    args = parser.parse_args()
+
+    total, degradation, isomerization, ratio, thc = synthetic_inventory(args.lots)
+    classifier = PotencyClassifier()
+
+    start = time.perf_counter()
+    looped = [scalar_grade(*lot) for lot in zip(total, degradation, isomerization)]
+    looped_compliance = [scalar_compliance(*lot) for lot in zip(ratio, thc)]
+    loop_s = time.perf_counter() - start
+
+    (grades, status), grade_s = best_of(
+        lambda: classifier.grade_batch(total, degradation, isomerization))
+    compliance, compliance_s = best_of(
+        lambda: classifier.compliance_batch(ratio, thc, 'hemp'))
+
+    assert grades.tolist() == [grade for grade, _ in looped]
+    assert status.tolist() == [passed for _, passed in looped]
+    assert np.array_equal(np.column_stack([compliance['compliant'], compliance['cbd_thc_check'],
+                                           compliance['thc_check']]),
+                          np.array(looped_compliance))
+
+    print(f"lots:             {args.lots:,}")
+    print(f"scalar loop:      {loop_s * 1e3:>10.1f} ms")
+    print(f"grade_batch:      {grade_s * 1e3:>10.2f} ms")
+    print(f"compliance_batch: {compliance_s * 1e3:>10.2f} ms")
+    print(f"speedup:          {loop_s / (grade_s + compliance_s):>10.0f}x")
+
+
+if __name__ == '__main__':
+    main()
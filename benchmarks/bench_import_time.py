@@ -0,0 +1,126 @@
+"""
+Benchmark: cold-start import profile of a real app.py run
+
+Runs app.py's first (Dashboard) render with streamlit's AppTest in a fresh
+interpreter under -X importtime, from a scratch working directory whose
+model registry holds a trained ExtractionOptimizer, then waits --settle
+seconds so the background workers take their first turn.
+Everything the script does at module level counts, not just its import
+statements. The same driver running a script that only imports streamlit,
+pandas and numpy (which pull in plotly and pyarrow themselves) is the
+baseline. Prints the slowest modules the app adds and exits non-zero if any
+deferred dependency (sklearn, fpdf, openpyxl, ...) is among them or their
+time exceeds --budget-ms.
+
+Usage: python benchmarks/bench_import_time.py [--budget-ms 0] [--top 15] [--settle 3]
+"""
+
+import os
+import re
+import sys
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, 'app.py')
+
+# Imported regardless of what app.py does
+BASELINE = 'import streamlit, pandas, numpy\n'
+
+# Only imported by the pages / trained models that need them. plotly is not
+# listed: the Dashboard draws its charts with it. Nor is pyarrow: pandas loads
+# its submodules itself for the first string column of any query.
+DEFERRED = ['sklearn', 'scipy', 'fpdf', 'openpyxl', 'gspread']
+
+# Render the script once, then give background threads time to run
+DRIVER = '''
+import sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+if at.exception:
+    sys.exit(f"Script raised: {at.exception[0].value}")
+time.sleep(float(sys.argv[2]))
+'''
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def register_trained_model(models_dir):
+    """Save a small trained optimizer, as a deployment would have after retraining"""
+    sys.path.append(ROOT)
+    from utils.model_registry import ModelRegistry
+    from utils.prediction_models import ExtractionOptimizer
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform([-80, 10, 800, 1500, 1.0], [-20, 30, 1500, 2500, 3.0], size=(200, 5))
+    optimizer = ExtractionOptimizer()
+    optimizer.train(X, 85 + 0.1 * X[:, 0] + rng.normal(0, 1, len(X)))
+    ModelRegistry(models_dir).save('extraction_optimizer', optimizer, X)
+
+
+def profile(script, settle, trained=False):
+    """[(module, self_us, cumulative_us, depth)] from a fresh -X importtime run of script"""
+    with tempfile.TemporaryDirectory() as workdir:
+        # The app creates data/ relative to the working directory
+        models_dir = os.path.join(workdir, 'models')
+        if trained:
+            register_trained_model(models_dir)
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', DRIVER, script, str(settle)],
+                                cwd=workdir, capture_output=True, text=True,
+                                env={**os.environ, 'PYTHONPATH': ROOT, 'MODELS_DIR': models_dir})
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=0,
+                        help='fail if the app adds more import time than this (0 = no budget)')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--settle', type=float, default=3,
+                        help='seconds to let background workers run after the first render')
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as f:
+        f.write(BASELINE)
+    try:
+        baseline = {module for module, *_ in profile(f.name, 0)}
+    finally:
+        os.remove(f.name)
+    rows = profile(APP, args.settle, trained=True)
+    total_us = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    added = [row for row in rows if row[0] not in baseline]
+    added_us = sum(self_us for _, self_us, _, _ in added)
+
+    print(f"{'cumulative ms':>14}  {'self ms':>8}  module (added by the app)")
+    for module, self_us, cumulative_us, _ in sorted(added, key=lambda row: -row[2])[:args.top]:
+        print(f"{cumulative_us / 1e3:>14.1f}  {self_us / 1e3:>8.1f}  {module}")
+    print(f"\ntotal:         {total_us / 1e3:.1f} ms over {len(rows)} modules")
+    print(f"added by app:  {added_us / 1e3:.1f} ms over {len(added)} modules")
+
+    deferred = {module for module, *_ in added if module.split('.')[0] in DEFERRED}
+    # Report fpdf, not fpdf and each of its submodules
+    deferred = sorted(module for module in deferred
+                      if not any(module.startswith(other + '.') for other in deferred))
+    failures = []
+    if deferred:
+        failures.append(f"deferred dependencies imported at startup: {', '.join(deferred)}")
+    if args.budget_ms and added_us / 1e3 > args.budget_ms:
+        failures.append(f"app imports take {added_us / 1e3:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: bulk ingest_batches and re-ingest (upsert) throughput, checking the
+trigger-maintained summary tables against a full GROUP BY scan of batches
+
+Usage: python benchmarks/bench_ingest.py [--rows 20000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.data_processor import DataProcessor, SUMMARY_TABLES, SUMMARY_KEYS
+
+
+def synthetic_records(n_rows, seed=0):
+    """Batch records spread over a year and a handful of temperatures, with gaps"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'batch_id': [f"BATCH-{i:06d}" for i in range(n_rows)],
+        'date': (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n_rows), 'D')).strftime('%Y-%m-%d'),
+        'strain': rng.choice(['OG Kush', 'Blue Dream', 'Sour Diesel'], n_rows),
+        'extraction_temp_c': rng.choice([-80, -60, -40, -20], n_rows).astype(float),
+        'extraction_efficiency': rng.uniform(60, 95, n_rows),
+        'd9_thc': rng.uniform(60, 92, n_rows),
+        'd8_thc': rng.uniform(0, 5, n_rows),
+        'cbn': rng.uniform(0, 4, n_rows)
+    })
+    df.loc[rng.random(n_rows) < 0.05, 'extraction_efficiency'] = np.nan
+    df.loc[rng.random(n_rows) < 0.02, 'extraction_temp_c'] = np.nan
+    return df
+
+
+def scanned_summary(processor, table):
+    """What the summary table should hold, recomputed from batches"""
+    key_name, key_expr = SUMMARY_TABLES[table].split()[0], SUMMARY_KEYS[table]
+    return processor.read_sql(f"""
+        SELECT {key_expr.format(row='batches')} AS {key_name}, COUNT(*) AS batch_count,
+               AVG(extraction_efficiency) AS mean_efficiency,
+               AVG(degradation_index) AS mean_degradation_index
+        FROM batches
+        WHERE {key_expr.format(row='batches')} IS NOT NULL
+        GROUP BY 1 ORDER BY 1
+    """)
+
+
+def check_summaries(processor):
+    for table, stored in (('batch_monthly_summary', processor.monthly_summary()),
+                          ('batch_temperature_summary', processor.temperature_summary())):
+        pd.testing.assert_frame_equal(stored, scanned_summary(processor, table), check_dtype=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    args = parser.parse_args()
+
+    records = synthetic_records(args.rows)
+    # Same batch IDs again with new dates, temperatures and results
+    changed = synthetic_records(args.rows, seed=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        processor = DataProcessor(os.path.join(tmp, 'extraction.db'))
+        processor.init_database()
+
+        start = time.perf_counter()
+        first = processor.ingest_batches(records)
+        insert_s = time.perf_counter() - start
+        check_summaries(processor)
+        last_seq = int(processor.fetch_batches_since(0, ['batch_id'])['change_seq'].max())
+
+        start = time.perf_counter()
+        again = processor.ingest_batches(records)
+        same_s = time.perf_counter() - start
+        check_summaries(processor)
+        # Unchanged rows don't look new to incremental consumers
+        assert processor.fetch_batches_since(last_seq, ['batch_id']).empty
+
+        start = time.perf_counter()
+        updated = processor.ingest_batches(changed)
+        update_s = time.perf_counter() - start
+        check_summaries(processor)
+        assert len(processor.fetch_batches_since(last_seq, ['batch_id'])) == args.rows
+
+        # Single-row saves of an existing batch go through the same upsert
+        processor.save_batch(changed.iloc[0].dropna().to_dict())
+        processor.save_batch(changed.iloc[0].dropna().to_dict())
+        check_summaries(processor)
+
+        for result in (first, again, updated):
+            assert result['written'] == args.rows and not result['errors'], result['errors'][:3]
+
+    print(f"rows:            {args.rows:,}")
+    print(f"insert:          {insert_s * 1e3:>10.1f} ms  ({args.rows / insert_s:,.0f} rows/s)")
+    print(f"re-ingest same:  {same_s * 1e3:>10.1f} ms  ({args.rows / same_s:,.0f} rows/s)")
+    print(f"re-ingest new:   {update_s * 1e3:>10.1f} ms  ({args.rows / update_s:,.0f} rows/s)")
+    print("summaries match a full GROUP BY scan after every pass")
+
+
+if __name__ == '__main__':
+    main()
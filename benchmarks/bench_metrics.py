@@ -0,0 +1,60 @@
+"""
+Benchmark: DataProcessor.calculate_metrics_frame vs looping calculate_metrics
+
+Usage: python benchmarks/bench_metrics.py [--rows 50000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.data_processor import DataProcessor
+
+CANNABINOIDS = ['d9_thc', 'd8_thc', 'cbd', 'cbg', 'cbn', 'cbc']
+METRICS = ['total_cannabinoids', 'total_thc', 'degradation_index', 'isomerization_ratio']
+
+
+def synthetic_results(n_rows, seed=0):
+    """HPLC/GC-style results, including some zero-THC rows and blank cells"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(0, 5, size=(n_rows, len(CANNABINOIDS))), columns=CANNABINOIDS)
+    df['d9_thc'] = rng.uniform(60, 95, n_rows)
+    df.loc[df.sample(frac=0.01, random_state=seed).index, ['d9_thc', 'd8_thc']] = 0
+    df = df.mask(rng.random(df.shape) < 0.02)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    args = parser.parse_args()
+
+    df = synthetic_results(args.rows)
+    # A blank cell is a key the record never had, as in ingest_batches input
+    records = [{key: value for key, value in row.items() if not pd.isna(value)}
+               for row in df.to_dict('records')]
+    start = time.perf_counter()
+    looped = pd.DataFrame([DataProcessor.calculate_metrics(row) for row in records])
+    loop_s = time.perf_counter() - start
+
+    # Best of several runs; a single call is only a few milliseconds
+    frame_s = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        framed = DataProcessor.calculate_metrics_frame(df)
+        frame_s = min(frame_s, time.perf_counter() - start)
+
+    pd.testing.assert_frame_equal(looped[METRICS], framed[METRICS], check_exact=True)
+
+    print(f"rows:        {args.rows:,}")
+    print(f"row loop:    {args.rows / loop_s:>14,.0f} rows/s")
+    print(f"frame:       {args.rows / frame_s:>14,.0f} rows/s")
+    print(f"speedup:     {loop_s / frame_s:>14,.0f}x")
+
+
+if __name__ == '__main__':
+    main()
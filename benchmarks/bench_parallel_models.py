@@ -0,0 +1,54 @@
+"""
+Benchmark: RandomForest training and batch-prediction throughput vs core count
+
+Usage: python benchmarks/bench_parallel_models.py [--rows 50000] [--backend threading]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.prediction_models import ExtractionOptimizer, ExecutionConfig
+
+
+def synthetic_batches(n_rows, seed=0):
+    """Random DoE-style feature rows with a smooth efficiency target"""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform([-80, 10, 800, 1500, 1.0], [-40, 30, 1500, 2500, 3.0], size=(n_rows, 5))
+    y = 85 + 0.1 * np.abs(X[:, 0] + 60) - 0.05 * (X[:, 1] - 20) ** 2 + rng.normal(0, 1, n_rows)
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--predict-rows', type=int, default=200_000)
+    parser.add_argument('--backend', choices=ExecutionConfig.BACKENDS, default='threading')
+    args = parser.parse_args()
+
+    X, y = synthetic_batches(args.rows)
+    X_pred, _ = synthetic_batches(args.predict_rows, seed=1)
+
+    cores = os.cpu_count() or 1
+    core_counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+
+    print(f"{'cores':>5} {'train s':>9} {'predict rows/s':>15}")
+    for n_jobs in core_counts:
+        optimizer = ExtractionOptimizer(ExecutionConfig(n_jobs=n_jobs, backend=args.backend))
+
+        start = time.perf_counter()
+        optimizer.train(X, y)
+        train_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        optimizer.predict(X_pred)
+        predict_s = time.perf_counter() - start
+
+        print(f"{n_jobs:>5} {train_s:>9.2f} {args.predict_rows / predict_s:>15,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: PotencyClassifier training time and predict_proba throughput per model type
+
+Usage: python benchmarks/bench_potency_classifier.py [--rows 20000] [--svc-rows 5000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.prediction_models import PotencyClassifier
+
+
+def synthetic_lots(n_rows, noise=0.02, seed=0):
+    """Lot metrics graded by the rules, with a fraction of labels flipped"""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(75, 100, n_rows),
+        rng.uniform(0, 7, n_rows),
+        rng.uniform(0, 12, n_rows)
+    ])
+    y = PotencyClassifier().predict(X)
+    flip = rng.random(n_rows) < noise
+    y[flip] = rng.choice(['A', 'B', 'C', 'F'], flip.sum())
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--svc-rows', type=int, default=5_000,
+                        help='training rows for kernel SVC, which scales ~quadratically')
+    parser.add_argument('--predict-rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    X, y = synthetic_lots(args.rows)
+    X_test, _ = synthetic_lots(args.predict_rows, noise=0, seed=1)
+    truth = PotencyClassifier().predict(X_test)
+
+    print(f"{'model':<18} {'train rows':>10} {'train s':>9} {'proba rows/s':>14} {'accuracy':>9}")
+    for model_type in PotencyClassifier.MODEL_TYPES:
+        n_train = min(args.rows, args.svc_rows) if model_type == 'svc' else args.rows
+        classifier = PotencyClassifier(model_type=model_type)
+
+        start = time.perf_counter()
+        classifier.train(X[:n_train], y[:n_train])
+        train_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        proba = classifier.predict_proba(X_test)
+        proba_s = time.perf_counter() - start
+
+        accuracy = np.mean(classifier.classes_[proba.argmax(axis=1)] == truth)
+        print(f"{model_type:<18} {n_train:>10,} {train_s:>9.2f} "
+              f"{len(X_test) / proba_s:>14,.0f} {accuracy:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
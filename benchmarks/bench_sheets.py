@@ -0,0 +1,229 @@
+"""
+Benchmark: SheetWriter write-behind queue against a local fake Google Sheets
+
+FakeSheetsClient stands in for the gspread client: open_by_url(url).sheet1
+keeps rows in memory, exposes append_rows()/get_all_records(), counts calls
+and raises injected API errors (429 quota, 5xx, 4xx) on demand. The script
+installs it with set_client_factory and checks batching, retry with
+backoff, requeue on failure, flush-before-read and the background worker,
+then times the queue.
+
+Usage: python benchmarks/bench_sheets.py [--rows 10000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import google_sheets_handler as sheets
+from google_sheets_handler import SheetWriter, ROW_KEYS
+
+
+class FakeAPIError(Exception):
+    """Carries an HTTP status in .code, like gspread's APIError"""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeWorksheet:
+    def __init__(self, latency=0.0):
+        self.rows = []
+        self.calls = {'append_rows': 0, 'get_all_records': 0}
+        self.failures = []
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def fail(self, *codes):
+        """Raise FakeAPIError(code) on the next API calls, one per code"""
+        with self._lock:
+            self.failures.extend(codes)
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            code = self.failures.pop(0) if self.failures else None
+        if self.latency:
+            time.sleep(self.latency)
+        if code is not None:
+            raise FakeAPIError(code)
+
+    def append_rows(self, rows, value_input_option='RAW'):
+        self._call('append_rows')
+        with self._lock:
+            self.rows.extend(list(row) for row in rows)
+
+    def get_all_records(self):
+        self._call('get_all_records')
+        with self._lock:
+            return [dict(zip(ROW_KEYS, row)) for row in self.rows]
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheet1):
+        self.sheet1 = sheet1
+
+
+class FakeSheetsClient:
+    """In-memory stand-in for an authorized gspread client"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sheets = {}
+        self.open_failures = []
+        self.open_calls = 0
+        self._lock = threading.Lock()
+
+    def open_by_url(self, url):
+        with self._lock:
+            self.open_calls += 1
+            code = self.open_failures.pop(0) if self.open_failures else None
+        if code is not None:
+            raise FakeAPIError(code)
+        with self._lock:
+            sheet = self.sheets.setdefault(url, FakeWorksheet(self.latency))
+        return FakeSpreadsheet(sheet)
+
+
+def record(i):
+    return {'batch_id': f"BATCH-{i:05d}", 'date': '2024-05-01', 'technician': 'Tech_A',
+            'strain': 'OG Kush', 'temp_c': -60, 'time_min': 20, 'thc_percent': 88.1,
+            'degradation_index': 2.1}
+
+
+def install_fake(**kwargs):
+    client = FakeSheetsClient(**kwargs)
+    sheets.set_client_factory(lambda: client)
+    return client
+
+
+def check_batching():
+    client = install_fake()
+    writer = SheetWriter(max_rows_per_call=40, base_delay=0.001)
+    for i in range(100):
+        writer.enqueue('sheet-a', record(i))
+        writer.enqueue('sheet-b', record(i))
+    assert writer.flush() == 200 and writer.pending == 0
+    for url in ('sheet-a', 'sheet-b'):
+        sheet = client.sheets[url]
+        assert [row[0] for row in sheet.rows] == [record(i)['batch_id'] for i in range(100)]
+        assert sheet.calls['append_rows'] == 3, sheet.calls
+    assert client.open_calls == 2
+
+
+def check_retry():
+    client = install_fake()
+    writer = SheetWriter(base_delay=0.001)
+    writer.enqueue('sheet', record(0))
+    client.open_by_url('sheet').sheet1.fail(429, 503)
+    assert writer.flush() == 1
+    sheet = client.sheets['sheet']
+    assert sheet.calls['append_rows'] == 3 and len(sheet.rows) == 1
+
+
+def check_requeue():
+    client = install_fake()
+    writer = SheetWriter(retries=2, base_delay=0.001)
+    sheet = client.open_by_url('sheet').sheet1
+    writer.enqueue('sheet', record(0))
+    sheet.fail(429, 429, 429)
+    try:
+        writer.flush()
+        raise AssertionError("flush should fail once retries run out")
+    except FakeAPIError:
+        pass
+    # Failed rows go back in front of anything queued since
+    writer.enqueue('sheet', record(1))
+    assert writer.pending == 2 and not sheet.rows
+    assert writer.flush() == 2
+    assert [row[0] for row in sheet.rows] == ['BATCH-00000', 'BATCH-00001']
+
+
+def check_not_retryable():
+    client = install_fake()
+    writer = SheetWriter(base_delay=0.001)
+    sheet = client.open_by_url('sheet').sheet1
+    writer.enqueue('sheet', record(0))
+    sheet.fail(400)
+    try:
+        writer.flush()
+        raise AssertionError("a 400 should not be retried")
+    except FakeAPIError:
+        pass
+    assert sheet.calls['append_rows'] == 1 and writer.pending == 1
+
+
+def check_open_outside_lock():
+    client = install_fake()
+    client.open_failures = [503]
+    retrying = threading.Event()
+
+    def slow_sleep(delay):
+        retrying.set()
+        time.sleep(0.5)
+
+    # get_worksheet's backoff must not hold the client lock
+    original = sheets.with_retries
+    sheets.with_retries = lambda call, **kwargs: original(call, sleep=slow_sleep, **kwargs)
+    try:
+        opener = threading.Thread(target=sheets.get_worksheet, args=('sheet',))
+        opener.start()
+        assert retrying.wait(5)
+        start = time.perf_counter()
+        assert sheets.connect_to_google() is client
+        assert time.perf_counter() - start < 0.1, "connect_to_google waited on a retrying open"
+        opener.join()
+    finally:
+        sheets.with_retries = original
+    assert client.open_calls == 2
+
+
+def check_background_and_read():
+    client = install_fake()
+    writer = sheets.start_sheet_writer(interval=60, batch_size=10)
+    for i in range(10):
+        sheets.save_to_google('sheet', record(i))
+    # batch_size rows wake the worker without waiting out the interval
+    deadline = time.monotonic() + 5
+    while len(client.sheets.get('sheet', FakeWorksheet()).rows) < 10:
+        assert time.monotonic() < deadline, "worker did not flush a full batch"
+        time.sleep(0.01)
+    # A read flushes rows still queued locally first
+    sheets.save_to_google('sheet', record(10))
+    df = sheets.get_all_from_google('sheet')
+    assert len(df) == 11 and writer.pending == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000)
+    args = parser.parse_args()
+
+    for check in (check_batching, check_retry, check_requeue, check_not_retryable,
+                  check_open_outside_lock, check_background_and_read):
+        check()
+        print(f"ok  {check.__name__}")
+
+    client = install_fake(latency=0.05)
+    writer = SheetWriter(max_rows_per_call=1_000)
+    start = time.perf_counter()
+    for i in range(args.rows):
+        writer.enqueue('sheet', record(i))
+    enqueue_s = time.perf_counter() - start
+    start = time.perf_counter()
+    writer.flush()
+    flush_s = time.perf_counter() - start
+    calls = client.sheets['sheet'].calls['append_rows']
+
+    print(f"\nrows:             {args.rows:,}")
+    print(f"enqueue:          {enqueue_s / args.rows * 1e6:>8.2f} us/row")
+    print(f"flush (50 ms/call fake latency): {flush_s * 1e3:.0f} ms in {calls} append_rows calls")
+    print(f"one call per row would take ~{args.rows * 0.05:.0f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,62 +1,242 @@
+"""
+Google Sheets Sync
+Cached service-account client and a write-behind queue that appends rows
+in batches, retrying quota and server errors with backoff
+"""
+
+import os
 import json
-from io import StringIO
-from secrets import GOOGLE_CREDENTIALS
-
-def connect_to_google():
-    scopes = [
-        'https://www.googleapis.com/auth/spreadsheets',
-        'https://www.googleapis.com/auth/drive'
-    ]
-    
-    # Read credentials from the string
-    creds_info = json.loads(GOOGLE_CREDENTIALS)
-    creds = Credentials.from_service_account_info(creds_info, scopes=scopes)
-    client = gspread.authorize(creds)
-    return clientimport gspread
-from google.oauth2.service_account import Credentials
+import time
+import atexit
+import random
+import threading
 import pandas as pd
+from utils.background import PeriodicWorker
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+CREDENTIALS_FILE = 'password.json'
+
+# Column order of the rows written to the sheet
+ROW_KEYS = ['batch_id', 'date', 'technician', 'strain', 'temp_c', 'time_min', 'thc_percent', 'degradation_index']
+
+
+def _authorize():
+    """
+    Service-account client from the GOOGLE_CREDENTIALS JSON string if set,
+    else from password.json
+    """
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds_json = os.environ.get('GOOGLE_CREDENTIALS')
+    if creds_json:
+        creds = Credentials.from_service_account_info(json.loads(creds_json), scopes=SCOPES)
+    else:
+        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
+    return gspread.authorize(creds)
+
+
+_client = None
+_client_factory = _authorize
+_worksheets = {}
+_client_lock = threading.Lock()
+
+
+def set_client_factory(factory):
+    """
+    Replace how the client is built, e.g. with a local fake for tests
+
+    factory: zero-argument callable returning an object with
+    open_by_url(url).sheet1 exposing append_rows() and get_all_records()
+    """
+    global _client_factory, _client
+    with _client_lock:
+        _client_factory = factory or _authorize
+        _client = None
+        _worksheets.clear()
+
+
+def connect_to_google(refresh=False):
+    """
+    Process-wide authorized client
+
+    Authorization happens once; the credentials object refreshes its access
+    token on expiry, so later calls reuse the same token.
+    """
+    global _client
+    with _client_lock:
+        if _client is None or refresh:
+            _client = _client_factory()
+            _worksheets.clear()
+        return _client
+
+
+def get_worksheet(sheet_url):
+    """First worksheet of sheet_url, opened once per process"""
+    client = connect_to_google()
+    with _client_lock:
+        sheet = _worksheets.get(sheet_url)
+    if sheet is not None:
+        return sheet
+    # Opened outside the lock: retries back off for up to a minute and must
+    # not hold up other threads' connect_to_google()
+    sheet = with_retries(lambda: client.open_by_url(sheet_url).sheet1)
+    with _client_lock:
+        # Keep the first one if another thread opened it meanwhile, unless
+        # the client was replaced while this one was opening
+        if _client is client:
+            sheet = _worksheets.setdefault(sheet_url, sheet)
+    return sheet
+
+
+def _is_retryable(error):
+    """Quota (429) and server (5xx) errors are worth retrying"""
+    status = getattr(error, 'code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def with_retries(call, retries=5, base_delay=1.0, max_delay=32.0, sleep=time.sleep):
+    """
+    Call call(), retrying retryable API errors with exponential backoff
+
+    Delays double from base_delay up to max_delay, with jitter so several
+    processes hitting the quota don't retry in lockstep.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == retries or not _is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            sleep(delay * random.uniform(0.5, 1))
+
+
+def to_row(data):
+    """Sheet row for a batch record"""
+    return [data.get(key, '') for key in ROW_KEYS]
+
+
+class SheetWriter(PeriodicWorker):
+    """
+    Write-behind queue of rows per sheet
+
+    enqueue() only buffers the row. The worker flushes every interval
+    seconds, or as soon as batch_size rows are pending, with one
+    append_rows call per sheet. Rows whose append fails are put back at
+    the front of the queue for the next flush.
+    """
+
+    def __init__(self, interval=10, batch_size=100, max_rows_per_call=1_000, retries=5,
+                 base_delay=1.0):
+        super().__init__(interval)
+        self.batch_size = batch_size
+        self.max_rows_per_call = max_rows_per_call
+        self.retries = retries
+        self.base_delay = base_delay
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def enqueue(self, sheet_url, data):
+        """Queue one batch record for sheet_url"""
+        with self._lock:
+            rows = self._pending.setdefault(sheet_url, [])
+            rows.append(to_row(data))
+            full = len(rows) >= self.batch_size
+        if full:
+            self.wake()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return sum(len(rows) for rows in self._pending.values())
+
+    def run_once(self):
+        """Flush every sheet; returns the number of rows written"""
+        with self._lock:
+            urls = list(self._pending)
+        written = 0
+        error = None
+        for sheet_url in urls:
+            # One failing sheet shouldn't hold back the others
+            try:
+                written += self.flush(sheet_url)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return written
+
+    def flush(self, sheet_url=None):
+        """Append queued rows now (all sheets when sheet_url is None)"""
+        if sheet_url is None:
+            return self.run_once()
+
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    rows = self._pending.get(sheet_url, [])
+                    batch = rows[:self.max_rows_per_call]
+                    self._pending[sheet_url] = rows[len(batch):]
+                if not batch:
+                    return written
+                try:
+                    sheet = get_worksheet(sheet_url)
+                    with_retries(lambda: sheet.append_rows(batch, value_input_option='USER_ENTERED'),
+                                 retries=self.retries, base_delay=self.base_delay)
+                except Exception:
+                    with self._lock:
+                        self._pending[sheet_url] = batch + self._pending[sheet_url]
+                    raise
+                written += len(batch)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def start_sheet_writer(**kwargs):
+    """Start the process-wide sheet writer once and return it"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SheetWriter(**kwargs)
+            # Daemon thread: flush what's left on a clean interpreter exit
+            atexit.register(_flush_on_exit, _writer)
+        return _writer.start()
+
+
+def _flush_on_exit(writer):
+    try:
+        writer.flush()
+    except Exception as e:
+        print(f"Error flushing {writer.pending} queued rows to Google: {e}")
 
-def connect_to_google():
-    """Connect to Google Sheets"""
-    scopes = [
-        'https://www.googleapis.com/auth/spreadsheets',
-        'https://www.googleapis.com/auth/drive'
-    ]
-    
-    creds = Credentials.from_service_account_file('password.json', scopes=scopes)
-    client = gspread.authorize(creds)
-    return client
 
 def save_to_google(sheet_url, data):
-    """Save batch data to Google Sheet"""
+    """Queue batch data for the Google Sheet; written by the background writer"""
     try:
-        client = connect_to_google()
-        sheet = client.open_by_url(sheet_url).sheet1
-        
-        # Create row from data
-        row = [
-            data.get('batch_id', ''),
-            data.get('date', ''),
-            data.get('technician', ''),
-            data.get('strain', ''),
-            data.get('temp_c', ''),
-            data.get('time_min', ''),
-            data.get('thc_percent', ''),
-            data.get('degradation_index', '')
-        ]
-        
-        sheet.append_row(row)
+        start_sheet_writer().enqueue(sheet_url, data)
         return True
     except Exception as e:
         print(f"Error saving to Google: {e}")
         return False
 
+
 def get_all_from_google(sheet_url):
-    """Get all data from Google Sheet"""
+    """Get all data from Google Sheet, including rows still queued locally"""
     try:
-        client = connect_to_google()
-        sheet = client.open_by_url(sheet_url).sheet1
-        data = sheet.get_all_records()
+        if _writer is not None:
+            _writer.flush(sheet_url)
+        sheet = get_worksheet(sheet_url)
+        data = with_retries(sheet.get_all_records)
         return pd.DataFrame(data)
     except Exception as e:
         print(f"Error reading from Google: {e}")
@@ -0,0 +1,116 @@
+"""
+Streaming Anomaly Scoring
+Scores new batches in micro-batches and writes scores back to the database
+"""
+
+import threading
+import numpy as np
+from utils.background import PeriodicWorker
+from utils.data_processor import DataProcessor
+from utils.prediction_models import AnomalyDetector
+
+FEATURE_COLUMNS = ['extraction_efficiency', 'degradation_index']
+
+
+class AnomalyStream(PeriodicWorker):
+    """
+    Consumes new and changed rows from the batches table and stores anomaly scores
+
+    Rows are read past a change_seq watermark, so a batch corrected by a
+    later save comes back and is rescored (the database drops its old score
+    when it changes).
+
+    Each micro-batch is scored with one vectorized anomaly_score call. Scored
+    rows join a rolling reference window, and the IsolationForest is refit
+    on that window every refit_every rows (rule-based scoring until then).
+    After each refit the whole window is rescored, so stored scores in the
+    window all come from the current model rather than a mix of rule
+    margins and older decision functions.
+
+    When the first new batches arrive, the window is seeded from the latest
+    window_size scored batches in the database, so a restart goes straight
+    back to IsolationForest scoring instead of waiting for min_train_rows
+    new rows. Nothing is fitted while there is nothing new to score.
+    """
+
+    def __init__(self, processor=None, detector=None, micro_batch_size=500, window_size=5_000,
+                 refit_every=500, min_train_rows=50, interval=2):
+        super().__init__(interval)
+        self.processor = processor or DataProcessor()
+        self.detector = detector or AnomalyDetector()
+        self.micro_batch_size = micro_batch_size
+        self.window_size = window_size
+        self.refit_every = refit_every
+        self.min_train_rows = min_train_rows
+
+        self.watermark = self.processor.last_scored_seq()
+        self._window = np.empty((0, len(FEATURE_COLUMNS)))
+        self._window_ids = np.empty(0, dtype=object)
+        self._since_refit = 0
+        self._seeded = False
+
+    def _seed_window(self):
+        """Load the latest scored batches as the reference window and fit on them"""
+        history = self.processor.get_anomaly_scores(limit=self.window_size)
+        history = history.dropna(subset=FEATURE_COLUMNS).iloc[::-1]
+        self._window = history[FEATURE_COLUMNS].to_numpy(dtype=float)
+        self._window_ids = history['batch_id'].to_numpy(dtype=object)
+        self._seeded = True
+        # A detector passed in already trained is kept as given
+        if not self.detector.is_trained and len(self._window) >= self.min_train_rows:
+            self._refit()
+
+    def run_once(self):
+        """Score every pending micro-batch; returns the number of rows scored"""
+        scored = 0
+        while True:
+            batches = self.processor.fetch_batches_since(
+                self.watermark, ['batch_id'] + FEATURE_COLUMNS, limit=self.micro_batch_size
+            )
+            if batches.empty:
+                return scored
+            if not self._seeded:
+                self._seed_window()
+
+            rows = batches.dropna(subset=FEATURE_COLUMNS)
+            if not rows.empty:
+                X = rows[FEATURE_COLUMNS].to_numpy(dtype=float)
+                scores = self.detector.anomaly_score(X)
+                self.processor.save_anomaly_scores(rows['batch_id'], scores)
+                self._update_window(X, rows['batch_id'].to_numpy(dtype=object))
+                scored += len(rows)
+
+            self.watermark = int(batches['change_seq'].max())
+
+    def _update_window(self, X, batch_ids):
+        """Append to the rolling reference window and refit when due"""
+        # A rescored batch replaces its earlier values in the window
+        keep = ~np.isin(self._window_ids, batch_ids)
+        self._window = np.vstack([self._window[keep], X])[-self.window_size:]
+        self._window_ids = np.concatenate([self._window_ids[keep], batch_ids])[-self.window_size:]
+        self._since_refit += len(X)
+
+        due = self._since_refit >= self.refit_every or not self.detector.is_trained
+        if due and len(self._window) >= self.min_train_rows:
+            self._refit()
+
+    def _refit(self):
+        """Fit a new IsolationForest on the window and rescore the window with it"""
+        detector = AnomalyDetector(self.detector.execution)
+        detector.train(self._window)
+        self.processor.save_anomaly_scores(self._window_ids, detector.anomaly_score(self._window))
+        self.detector = detector
+        self._since_refit = 0
+
+
+_stream = None
+_stream_lock = threading.Lock()
+
+
+def start_anomaly_stream(**kwargs):
+    """Start the process-wide anomaly stream once and return it"""
+    global _stream
+    with _stream_lock:
+        if _stream is None:
+            _stream = AnomalyStream(**kwargs)
+        return _stream.start()
@@ -0,0 +1,64 @@
+"""
+Background Workers
+Run periodic jobs on a daemon thread so the Streamlit UI never blocks
+"""
+
+import threading
+import traceback
+
+
+class PeriodicWorker:
+    """
+    Calls run_once() every interval seconds on a daemon thread
+
+    Subclasses implement run_once(); errors are printed and the loop keeps
+    going so one bad batch never stops the worker. initial_delay postpones
+    the first run (wake() still runs it early).
+    """
+
+    def __init__(self, interval=60, initial_delay=0):
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def start(self):
+        """Start the worker thread (no-op if already running)"""
+        if self.is_running:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Signal the worker to stop and wait for the current run to finish"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Run the next iteration now instead of waiting out the interval"""
+        self._wake.set()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self):
+        if self.initial_delay:
+            self._wake.wait(self.initial_delay)
+            self._wake.clear()
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in {type(self).__name__}: {e}")
+                traceback.print_exc()
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -4,23 +4,89 @@ Certificate of Analysis Generator
 Matches Treehouse CoA format
 """
 
+import io
+import os
+import re
+import json
+import zlib
+import hashlib
+import zipfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from fpdf import FPDF
 from datetime import datetime
 import pandas as pd
 
+# Core PDF fonts only cover latin-1
+LATIN1_SUBSTITUTES = str.maketrans({'Δ': 'D', 'μ': 'µ', '•': '-'})
+
+# Default instrument / calibration config printed on every certificate
+INSTRUMENT_LINES = (
+    "Instrument: Varian 3900 GC-FID",
+    "Column: RTX-5MS 30m x 0.25mm x 0.25μm",
+    "Carrier: Helium at 1 mL/min",
+    "Detector: FID @ 250°C",
+    "Injector: 250°C",
+    "Injection: 1 μL autosampler",
+    "Split Ratio: 1:50"
+)
+CALIBRATION_DATE = '16/3/2023'
+
+# Results table rows: data key, label, default % w/w
+COMPONENTS = [
+    ('cbc', 'CBC', 0.1738),
+    ('cbd', 'CBD', 0.7541),
+    ('d8_thc', 'Δ8-THC', 3.3685),
+    ('d9_thc', 'Δ9-THC', 84.7281),
+    ('cbg', 'CBG', 1.5392),
+    ('cbn', 'CBN', 1.8792)
+]
+
+# Bump when the layout changes so cached certificates are re-rendered
+CACHE_FORMAT = 1
+COA_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'coa_cache')
+
+INFO_FIELDS = ['client', 'batch_id', 'sample_type', 'sample_weight', 'analysis_date', 'analyst']
+
 class CoAGenerator(FPDF):
     def __init__(self):
         super().__init__()
         self.set_auto_page_break(auto=True, margin=15)
 
+    def normalize_text(self, text):
+        return super().normalize_text(text.translate(LATIN1_SUBSTITUTES))
+
     def header(self):
         # Logo placeholder
         self.set_font('Arial', 'B', 16)
         self.cell(0, 10, 'CERTIFICATE OF ANALYSIS', 0, 1, 'C')
         self.ln(5)
 
-    def generate_coa(self, data, output_path):
-        """Generate CoA PDF matching Treehouse format"""
+    def generate_coa(self, data, output_path=None):
+        """
+        Generate CoA PDF matching Treehouse format
+
+        Writes to output_path, or returns the PDF as bytes when it is None
+        """
+        fields = _coa_fields(data)
+        self._layout(_template_config(data), lambda name, w, h, border=0, ln=0, align='', fill=False:
+                     self.cell(w, h, fields[name], border, ln, align, fill))
+        return self._save(output_path)
+
+    def _save(self, output_path):
+        if output_path is None:
+            return bytes(self.output())
+        self.output(output_path)
+        return output_path
+
+    def _layout(self, config, slot):
+        """
+        Draw the certificate; per-lot text goes through slot(name, w, h, ...)
+
+        Everything drawn directly here is static for a given instrument /
+        calibration config, which is what lets CoATemplate pre-render it.
+        """
+        instrument_lines, calibration_date = config
         self.add_page()
 
         # Sample info section
@@ -28,17 +94,8 @@ class CoAGenerator(FPDF):
         self.cell(0, 10, 'Sample Information', 0, 1)
         self.set_font('Arial', '', 10)
 
-        info_lines = [
-            f"Client: {data.get('client', 'Treehouse')}",
-            f"Batch ID: {data.get('batch_id', '')}",
-            f"Sample Type: {data.get('sample_type', 'Distillate')}",
-            f"Sample Weight: {data.get('sample_weight', 143)} mg",
-            f"Analysis Date: {data.get('analysis_date', datetime.now().strftime('%Y-%m-%d'))}",
-            f"Analyst: {data.get('analyst', 'Nigel Reeves')}"
-        ]
-
-        for line in info_lines:
-            self.cell(0, 6, line, 0, 1)
+        for name in INFO_FIELDS:
+            slot(name, 0, 6, 0, 1)
 
         self.ln(5)
 
@@ -47,16 +104,6 @@ class CoAGenerator(FPDF):
         self.cell(0, 10, 'Instrument Conditions', 0, 1)
         self.set_font('Arial', '', 10)
 
-        instrument_lines = [
-            "Instrument: Varian 3900 GC-FID",
-            "Column: RTX-5MS 30m x 0.25mm x 0.25μm",
-            "Carrier: Helium at 1 mL/min",
-            "Detector: FID @ 250°C",
-            "Injector: 250°C",
-            "Injection: 1 μL autosampler",
-            "Split Ratio: 1:50"
-        ]
-
         for line in instrument_lines:
             self.cell(0, 6, line, 0, 1)
 
@@ -77,39 +124,25 @@ class CoAGenerator(FPDF):
         # Table data
         self.set_font('Arial', '', 10)
 
-        components = [
-            ('CBC', data.get('cbc', 0.1738)),
-            ('CBD', data.get('cbd', 0.7541)),
-            ('Δ8-THC', data.get('d8_thc', 3.3685)),
-            ('Δ9-THC', data.get('d9_thc', 84.7281)),
-            ('CBG', data.get('cbg', 1.5392)),
-            ('CBN', data.get('cbn', 1.8792))
-        ]
-
-        total = sum([c[1] for c in components])
-
-        for name, value in components:
-            self.cell(60, 7, name, 1)
-            self.cell(40, 7, f"{value:.4f}", 1, 0, 'R')
-            self.cell(40, 7, f"{value*10:.4f}", 1, 0, 'R')
-            self.cell(40, 7, f"{value*9:.4f}", 1, 1, 'R')  # Assuming density 0.9
+        for key, label, _ in COMPONENTS:
+            self.cell(60, 7, label, 1)
+            slot(f"{key}_pct", 40, 7, 1, 0, 'R')
+            slot(f"{key}_mg_g", 40, 7, 1, 0, 'R')
+            slot(f"{key}_mg_ml", 40, 7, 1, 1, 'R')
 
         # Total row
         self.set_font('Arial', 'B', 10)
         self.cell(60, 8, 'TOTAL CANNABINOIDS', 1, 0, 'L', True)
-        self.cell(40, 8, f"{total:.4f}", 1, 0, 'R', True)
-        self.cell(40, 8, f"{total*10:.4f}", 1, 0, 'R', True)
-        self.cell(40, 8, f"{total*9:.4f}", 1, 1, 'R', True)
+        slot('total_pct', 40, 8, 1, 0, 'R', True)
+        slot('total_mg_g', 40, 8, 1, 0, 'R', True)
+        slot('total_mg_ml', 40, 8, 1, 1, 'R', True)
 
         self.ln(10)
 
         # Calculated metrics
         self.set_font('Arial', 'B', 11)
-        total_thc = data.get('d9_thc', 84.7281) + data.get('d8_thc', 3.3685)
-        degradation_idx = (data.get('cbn', 1.8792) / total_thc * 100) if total_thc > 0 else 0
-
-        self.cell(0, 8, f"Total THC (Δ9 + Δ8): {total_thc:.2f}%", 0, 1)
-        self.cell(0, 8, f"Degradation Index: {degradation_idx:.2f}%", 0, 1)
+        slot('total_thc', 0, 8, 0, 1)
+        slot('degradation_index', 0, 8, 0, 1)
 
         # Notes
         self.ln(5)
@@ -122,7 +155,7 @@ class CoAGenerator(FPDF):
             "• CBD is the combination of CBD and CBDA",
             "• % is the percentage weight of the component found in the sample",
             "• Components referenced against certified calibration standards",
-            "• Date of last calibration: 16/3/2023",
+            f"• Date of last calibration: {calibration_date}",
             "• This test does not include: pesticides, heavy metals, mycotoxins, molds, residual solvents"
         ]
 
@@ -132,16 +165,369 @@ class CoAGenerator(FPDF):
         # Signature
         self.ln(10)
         self.set_font('Arial', 'B', 10)
-        self.cell(0, 8, f"Analyst: {data.get('analyst', 'Nigel Reeves')}", 0, 1)
-        self.cell(0, 8, f"Date: {datetime.now().strftime('%Y-%m-%d')}", 0, 1)
+        slot('signature_analyst', 0, 8, 0, 1)
+        slot('signature_date', 0, 8, 0, 1)
 
-        # Save
-        self.output(output_path)
+
+class CoATemplate:
+    """
+    Static CoA layout rendered once, with per-lot text spliced into its bytes
+
+    The template is drawn through FPDF's public API with a unique
+    placeholder string in each per-lot cell, then serialized once. Finding
+    the placeholders' text operators in the page content streams splits
+    each page into static runs and slots. render() never builds an FPDF: it
+    rewrites each slot's operator in place with the lot's text (moving
+    right-aligned text to keep its right edge), recompresses the page
+    streams and patches the stream lengths, cross-reference offsets and
+    file ID, so a certificate costs a few small byte strings instead of a
+    full document object and output() pass. Text stays in layout order for
+    extraction. _parse checks every assumption it makes about the
+    serialized layout and raises if an fpdf2 release breaks one.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.slots = {}
+        self._widths = {}
+        self.pdf = CoAGenerator()
+        self.pdf._layout(config, self._record_slot)
+        self._k = self.pdf.k
+        self._pages = self.pdf.page
+        self._parse(bytes(self.pdf.output()))
+        # Only the serialized bytes are needed from here on
+        self.pdf = None
+
+    def _record_slot(self, name, w, h, border=0, ln=0, align='', fill=False):
+        pdf = self.pdf
+        placeholder = f"@@{len(self.slots)}@@"
+        # Right-aligned text ends where cell() would end it: the cell's right
+        # edge less the cell margin, in user units
+        right = pdf.x + (w or pdf.w - pdf.r_margin - pdf.x) - pdf.c_margin if align == 'R' else None
+        # Glyph widths in 1/1000 em, recovered through the public width API
+        font = (pdf.font_family, pdf.font_style)
+        if font not in self._widths:
+            self._widths[font] = {chr(c): round(pdf.get_string_width(chr(c)) * 1000 / pdf.font_size)
+                                  for c in range(32, 256)}
+        self.slots[placeholder.encode()] = (name, right, self._widths[font], pdf.font_size)
+        pdf.cell(w, h, placeholder, border, ln, align, fill)
+
+    def _parse(self, template):
+        """Split the serialized template into the parts render() reassembles"""
+        def check(condition, what):
+            if not condition:
+                raise RuntimeError(f"CoA template: unexpected fpdf2 output ({what})")
+
+        check(template.endswith(b'%%EOF\n') and b'\nxref\n' in template, 'no trailing xref table')
+        xref_start = template.rindex(b'\nxref\n') + 1
+        lines = template[xref_start:].split(b'\n')
+        count = int(lines[1].split()[1])
+        self._offsets = [int(entry[:10]) for entry in lines[2:2 + count]]
+        check(all(template.startswith(b'%d 0 obj' % number, offset)
+                  for number, offset in enumerate(self._offsets) if number), 'xref offsets')
+        self._trailer = template[template.index(b'trailer', xref_start):template.rindex(b'startxref')]
+
+        # Content stream object of each page, in page order
+        kids = re.search(rb'/Kids \[(.*?)\]', template, re.S)
+        check(kids, 'no page tree')
+        page_objects = list(map(int, re.findall(rb'(\d+) 0 R', kids.group(1))))
+        check(len(page_objects) == self._pages, 'page count')
+        stream_head = re.compile(rb'(\d+ 0 obj\s*<<.*?/Length )(\d+)(.*?>>\s*stream\r?\n)', re.S)
+        # Colour operators may sit between the position and the string
+        text_op = re.compile(rb'BT (-?[\d.]+) (-?[\d.]+) Td ([^()]*)\((@@\d+@@)\) Tj ET')
+        found = []
+        self._streams = []
+        for page_obj in page_objects:
+            contents = re.compile(rb'/Contents (\d+) 0 R').search(template, self._offsets[page_obj])
+            check(contents, 'page without a single content stream')
+            number = int(contents.group(1))
+            start = self._offsets[number]
+            head = stream_head.match(template, start)
+            check(head and b'/Filter /FlateDecode' in head.group(0), 'content stream header')
+            data_start = head.end()
+            data_end = data_start + int(head.group(2))
+            check(template.startswith(b'\nendstream\nendobj\n', data_end), 'content stream length')
+            end = data_end + len(b'\nendstream\nendobj\n')
+            static = zlib.decompress(template[data_start:data_end])
+
+            # Static bytes before each slot, with the slot's text position, then the tail
+            runs = []
+            cursor = 0
+            for op in text_op.finditer(static):
+                runs.append((static[cursor:op.start()], *op.group(1, 2, 3), *self.slots[op.group(4)]))
+                cursor = op.end()
+                found.append(op.group(4))
+            self._streams.append((number, start, end, head.group(1), head.group(3), runs, static[cursor:]))
+        check(sorted(found) == sorted(self.slots), 'slot text operators')
+        self._template = template[:xref_start]
+
+    def render(self, data, output_path=None):
+        """Splice one lot's values into a copy of the template bytes"""
+        fields = _coa_fields(data)
+        k = self._k
+        template = self._template
+        parts = []
+        cursor = 0
+        shifts = []
+        for number, start, end, head, tail, runs, rest in self._streams:
+            content = []
+            for static, x, y, colour, name, right, widths, size in runs:
+                text = fields[name].translate(LATIN1_SUBSTITUTES)
+                if right is not None:
+                    x = b"%.2f" % ((right - sum(widths[c] for c in text) * size / 1000) * k)
+                content += [static, b"BT %s %s Td %s(%s) Tj ET" % (x, y, colour, _escape_parens(text).encode('latin-1'))]
+            content.append(rest)
+            # Page streams are a few KiB: a 4 KiB window compresses them as well
+            # as zlib's defaults, without allocating a ~256 KiB deflate state
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 12, 4)
+            stream = compressor.compress(b"".join(content)) + compressor.flush()
+            obj = b"%s%d%s%s\nendstream\nendobj\n" % (head, len(stream), tail, stream)
+            parts += [template[cursor:start], obj]
+            shifts.append((start, len(obj) - (end - start)))
+            cursor = end
+        parts.append(template[cursor:])
+        body = b"".join(parts)
+
+        offsets = [offset + sum(delta for start, delta in shifts if start < offset) if offset else 0
+                   for offset in self._offsets]
+        xref = b"xref\n0 %d\n0000000000 65535 f \n%s" % (
+            len(offsets), b"".join(b"%010d 00000 n \n" % offset for offset in offsets[1:]))
+        file_id = hashlib.md5(body, usedforsecurity=False).hexdigest().upper().encode()
+        trailer = re.sub(rb'/ID \[<\w+><\w+>\]', b'/ID [<%s><%s>]' % (file_id, file_id), self._trailer)
+        pdf = b"%s%s%sstartxref\n%d\n%%%%EOF\n" % (body, xref, trailer, len(body))
+
+        if output_path is None:
+            return pdf
+        with open(output_path, 'wb') as f:
+            f.write(pdf)
         return output_path
 
 
-def generate_coa_pdf(data):
-    """Helper function to generate CoA"""
-    generator = CoAGenerator()
+def _escape_parens(text):
+    """Escape text for a PDF literal string, as FPDF does for core fonts"""
+    return text.replace('\\', '\\\\').replace(')', '\\)').replace('(', '\\(').replace('\r', '\\r')
+
+
+_templates = {}
+
+
+def get_template(data=None):
+    """Per-process CoATemplate for the data's instrument / calibration config"""
+    config = _template_config(data or {})
+    if config not in _templates:
+        _templates[config] = CoATemplate(config)
+    return _templates[config]
+
+
+def _template_config(data):
+    return (tuple(data.get('instrument_lines', INSTRUMENT_LINES)),
+            data.get('calibration_date', CALIBRATION_DATE))
+
+
+def _coa_fields(data):
+    """Every per-lot text on the certificate, keyed by slot name"""
+    analyst = data.get('analyst', 'Nigel Reeves')
+    analysis_date = data.get('analysis_date', datetime.now().strftime('%Y-%m-%d'))
+    fields = {
+        'client': f"Client: {data.get('client', 'Treehouse')}",
+        'batch_id': f"Batch ID: {data.get('batch_id', '')}",
+        'sample_type': f"Sample Type: {data.get('sample_type', 'Distillate')}",
+        'sample_weight': f"Sample Weight: {data.get('sample_weight', 143)} mg",
+        'analysis_date': f"Analysis Date: {analysis_date}",
+        'analyst': f"Analyst: {analyst}",
+        'signature_analyst': f"Analyst: {analyst}",
+        # Re-issues of the same analysis stay identical unless a report date is given
+        'signature_date': f"Date: {data.get('report_date', analysis_date)}"
+    }
+
+    total = 0
+    for key, _, default in COMPONENTS:
+        value = data.get(key, default)
+        total += value
+        fields[f"{key}_pct"] = f"{value:.4f}"
+        fields[f"{key}_mg_g"] = f"{value*10:.4f}"
+        fields[f"{key}_mg_ml"] = f"{value*9:.4f}"  # Assuming density 0.9
+
+    fields['total_pct'] = f"{total:.4f}"
+    fields['total_mg_g'] = f"{total*10:.4f}"
+    fields['total_mg_ml'] = f"{total*9:.4f}"
+
+    total_thc = data.get('d9_thc', 84.7281) + data.get('d8_thc', 3.3685)
+    degradation_idx = (data.get('cbn', 1.8792) / total_thc * 100) if total_thc > 0 else 0
+    fields['total_thc'] = f"Total THC (Δ9 + Δ8): {total_thc:.2f}%"
+    fields['degradation_index'] = f"Degradation Index: {degradation_idx:.2f}%"
+    return fields
+
+
+class CoACache:
+    """
+    Content-addressed on-disk store of rendered CoAs
+
+    Entries are keyed by a hash of everything printed on the certificate
+    (the normalized per-lot fields plus the instrument config), so a repeat
+    request is served from disk and any changed result misses. Files are
+    written atomically; hits refresh the mtime and the least recently used
+    entries are evicted once the directory grows past max_bytes.
+    """
+
+    def __init__(self, root=COA_CACHE_DIR, max_bytes=256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(data):
+        """SHA-256 of the certificate content for data"""
+        payload = [CACHE_FORMAT, _template_config(data), _coa_fields(data)]
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.pdf")
+
+    def get(self, data):
+        """Cached PDF bytes for data, or None on a miss"""
+        path = self._path(self.key(data))
+        try:
+            with open(path, 'rb') as f:
+                pdf = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return pdf
+
+    def put(self, data, pdf):
+        """Store rendered PDF bytes for data"""
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(self.key(data))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(pdf)
+            if self._size > self.max_bytes:
+                self._evict()
+        return pdf
+
+    def get_or_render(self, data, render=None):
+        """Serve data from the cache, rendering and storing it on a miss"""
+        pdf = self.get(data)
+        if pdf is None:
+            pdf = self.put(data, (render or generate_coa_bytes)(data))
+        return pdf
+
+    def render_many(self, records, **batch_kwargs):
+        """Like generate_coa_batch, but only cache misses go to the pool"""
+        records = list(records)
+        pdfs = [self.get(data) for data in records]
+        misses = [i for i, pdf in enumerate(pdfs) if pdf is None]
+        rendered = generate_coa_batch([records[i] for i in misses], **batch_kwargs)
+        for i, pdf in zip(misses, rendered):
+            pdfs[i] = self.put(records[i], pdf)
+        return pdfs
+
+    def clear(self):
+        """Remove every cached certificate"""
+        with self._lock:
+            for path, _, _ in self._scan()[0]:
+                _remove(path)
+            self._size = 0
+
+    def _scan(self):
+        """(path, mtime, size) per cached PDF, and their total size"""
+        entries = []
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if not entry.name.endswith('.pdf'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        except FileNotFoundError:
+            pass
+        return entries, sum(size for _, _, size in entries)
+
+    def _evict(self):
+        # Rescan so entries written by other processes are counted too
+        entries, total = self._scan()
+        for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+        self._size = total
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Process-wide default cache
+coa_cache = CoACache()
+
+
+def generate_coa_pdf(data, cache=None):
+    """Helper function to generate CoA, reusing the cached PDF for repeat requests"""
+    pdf = (cache or coa_cache).get_or_render(data)
     output_path = f"coa_{data.get('batch_id', 'unknown')}.pdf"
-    return generator.generate_coa(data, output_path)
+    with open(output_path, 'wb') as f:
+        f.write(pdf)
+    return output_path
+
+
+def generate_coa_bytes(data):
+    """Render one CoA in memory from the cached template and return the PDF bytes"""
+    return get_template(data).render(data)
+
+
+def generate_coa_batch(records, max_workers=None, executor=None):
+    """
+    Render many CoAs across a process pool
+
+    Returns PDF bytes in the same order as records. Pass an existing
+    executor to reuse a pool across calls; small jobs run in-process.
+    """
+    records = list(records)
+    max_workers = max_workers or os.cpu_count() or 1
+    if executor is None and (max_workers == 1 or len(records) < 2):
+        return [generate_coa_bytes(data) for data in records]
+
+    # A few records per task amortizes pickling without starving workers
+    chunksize = max(1, len(records) // (max_workers * 4))
+    if executor is not None:
+        return list(executor.map(generate_coa_bytes, records, chunksize=chunksize))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(generate_coa_bytes, records, chunksize=chunksize))
+
+
+def bundle_coas(records, pdfs=None, **batch_kwargs):
+    """
+    Zip CoAs for a multi-lot download, one CoA_<batch_id>.pdf per record
+
+    pdfs: already rendered bytes for records; rendered with
+    generate_coa_batch when omitted
+    """
+    if pdfs is None:
+        pdfs = generate_coa_batch(records, **batch_kwargs)
+
+    buffer = io.BytesIO()
+    seen = {}
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for data, pdf in zip(records, pdfs):
+            name = f"CoA_{data.get('batch_id', 'unknown')}"
+            seen[name] = seen.get(name, 0) + 1
+            if seen[name] > 1:
+                name = f"{name}_{seen[name]}"
+            bundle.writestr(f"{name}.pdf", pdf)
+    return buffer.getvalue()
@@ -6,19 +6,182 @@ Handles ETL from Excel, database operations, and metric calculations
 
 import pandas as pd
 import numpy as np
+import os
 import sqlite3
+import queue
+import functools
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+# Columns of the batches table, in schema order
+BATCH_COLUMNS = [
+    'batch_id', 'date', 'technician', 'strain', 'material_type',
+    'initial_weight_g', 'moisture_content', 'extraction_temp_c',
+    'extraction_time_min', 'rpm', 'final_weight_g', 'total_thc', 'total_cbd',
+    'total_cannabinoids', 'degradation_index', 'isomerization_ratio',
+    'extraction_efficiency', 'process_yield', 'status', 'created_at'
+]
+
+# batches columns stored as numbers; everything else is text
+NUMERIC_COLUMNS = [
+    'initial_weight_g', 'moisture_content', 'extraction_temp_c',
+    'extraction_time_min', 'rpm', 'final_weight_g', 'total_thc', 'total_cbd',
+    'total_cannabinoids', 'degradation_index', 'isomerization_ratio',
+    'extraction_efficiency', 'process_yield'
+]
+
+# Dashboard summary tables: key column definition and the expression it is
+# computed from for a batches row
+SUMMARY_TABLES = {
+    'batch_monthly_summary': 'month TEXT',
+    'batch_temperature_summary': 'extraction_temp_c NUMERIC'
+}
+SUMMARY_KEYS = {
+    'batch_monthly_summary': "substr({row}.date, 1, 7)",
+    'batch_temperature_summary': "{row}.extraction_temp_c"
+}
+
+# Raw lab-result fields that calculate_metrics derives totals from
+CANNABINOID_COLUMNS = ['d9_thc', 'd8_thc', 'cbd', 'cbg', 'cbn', 'cbc']
+
+class ConnectionPool:
+    """
+    Process-wide pool of SQLite connections to one database
+
+    Connections are opened with check_same_thread=False and handed to any
+    thread, so short-lived threads (each Streamlit rerun runs on a new one)
+    reuse open connections instead of reconnecting. At most max_size are
+    open; further checkouts wait up to timeout seconds for one to return.
+    A thread that already holds a connection gets the same one back, so
+    nested checkouts can't deadlock. on_open(conn) runs once, before any
+    connection is handed out, to create the schema.
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=30, on_open=None):
+        self.db_path = db_path
+        # Every ':memory:' connection is its own database; share just one
+        self.max_size = 1 if db_path == ':memory:' else max_size
+        self.timeout = timeout
+        self.on_open = on_open
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._ready = on_open is None
+        self._ready_lock = threading.Lock()
+        self._held = threading.local()
+
+    def _open(self):
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        # WAL lets the UI read while background workers write
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.max_size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            try:
+                return self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise sqlite3.OperationalError(
+                    f"No pooled connection to {self.db_path} free after {self.timeout}s") from None
+        try:
+            conn = self._open()
+            if not self._ready:
+                with self._ready_lock:
+                    if not self._ready:
+                        self.on_open(conn)
+                        self._ready = True
+            return conn
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the with block"""
+        conn = getattr(self._held, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        self._held.conn = conn
+        try:
+            yield conn
+        finally:
+            self._held.conn = None
+            # Never hand the next user someone else's open transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, on_open=None):
+    """The process-wide ConnectionPool for db_path, reset after a fork"""
+    global _pools_pid
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools_pid = os.getpid()
+            _pools.clear()
+        if key not in _pools:
+            _pools[key] = ConnectionPool(key, on_open=on_open)
+        return _pools[key]
+
+
 class DataProcessor:
     """Process and validate batch data"""
 
     def __init__(self, db_path='data/extraction.db'):
+        # No I/O here: the connection is opened on first database use
         self.db_path = db_path
-        self.init_database()
+        # An in-memory database lives as long as this processor's own pool
+        self._pool = ConnectionPool(db_path, on_open=self._create_schema) if db_path == ':memory:' else None
+
+    @property
+    def pool(self):
+        return self._pool or get_pool(self.db_path, on_open=self._create_schema)
+
+    def connection(self):
+        """
+        Pooled connection, checked out for a with block
+
+        Connections are shared by every DataProcessor and thread in the
+        process; the schema is created when the first one is opened.
+        """
+        return self.pool.connection()
+
+    @contextmanager
+    def transaction(self):
+        """Pooled connection that commits on success and rolls back on error"""
+        with self.connection() as conn:
+            with conn:
+                yield conn
 
     def init_database(self):
-        """Initialize SQLite database with tables"""
-        conn = sqlite3.connect(self.db_path)
+        """Initialize SQLite database with tables (once per process)"""
+        with self.connection():
+            pass
+
+    def _create_schema(self, conn):
+        """Create tables if missing"""
         cursor = conn.cursor()
 
         # Batches table
@@ -43,15 +206,321 @@ class DataProcessor:
                 extraction_efficiency REAL,
                 process_yield REAL,
                 status TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                change_seq INTEGER
             )
         """)
 
+        # change_seq orders inserts and in-place changes for incremental
+        # consumers; databases from before it was added take their rowids
+        if 'change_seq' not in {row[1] for row in cursor.execute("PRAGMA table_info(batches)")}:
+            cursor.execute("ALTER TABLE batches ADD COLUMN change_seq INTEGER")
+            cursor.execute("UPDATE batches SET change_seq = rowid")
+
+        # Anomaly scores written by the streaming QC stage
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS anomaly_scores (
+                batch_id TEXT PRIMARY KEY,
+                score REAL,
+                is_anomaly INTEGER,
+                scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (batch_id) REFERENCES batches (batch_id)
+            )
+        """)
+
+        # Indexes for dashboard filters and ordering
+        for column in ('date', 'strain', 'status', 'extraction_temp_c', 'created_at', 'change_seq'):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_batches_{column} ON batches ({column})")
+
+        # Summary tables, maintained incrementally by triggers on batches
+        created = not cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'batch_monthly_summary'"
+        ).fetchone()
+        for table, key in SUMMARY_TABLES.items():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {key} PRIMARY KEY,
+                    batch_count INTEGER NOT NULL DEFAULT 0,
+                    efficiency_sum REAL NOT NULL DEFAULT 0,
+                    efficiency_count INTEGER NOT NULL DEFAULT 0,
+                    degradation_sum REAL NOT NULL DEFAULT 0,
+                    degradation_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+        for statement in _summary_triggers():
+            cursor.execute(statement)
+
+        # A changed batch loses its anomaly score so the stream rescores it
+        cursor.execute("DROP TRIGGER IF EXISTS trg_anomaly_scores_invalidate")
+        cursor.execute(
+            "CREATE TRIGGER trg_anomaly_scores_invalidate AFTER UPDATE ON batches "
+            "BEGIN DELETE FROM anomaly_scores WHERE batch_id = OLD.batch_id; END"
+        )
+
         conn.commit()
-        conn.close()
+        if created:
+            self.rebuild_summaries(conn)
+
+    def rebuild_summaries(self, conn=None):
+        """Recompute the summary tables from scratch (e.g. for a pre-existing database)"""
+        if conn is None:
+            with self.connection() as conn:
+                return self.rebuild_summaries(conn)
+        with conn:
+            for table, key in SUMMARY_TABLES.items():
+                key_name, key_expr = key.split()[0], SUMMARY_KEYS[table]
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"""
+                    INSERT INTO {table}
+                    SELECT {key_expr.format(row='batches')} AS {key_name}, COUNT(*),
+                           COALESCE(SUM(extraction_efficiency), 0), COUNT(extraction_efficiency),
+                           COALESCE(SUM(degradation_index), 0), COUNT(degradation_index)
+                    FROM batches
+                    WHERE {key_expr.format(row='batches')} IS NOT NULL
+                    GROUP BY 1
+                """)
+
+    def monthly_summary(self):
+        """Batch count, mean efficiency and mean degradation index per month"""
+        return self._read_summary('batch_monthly_summary', 'month')
+
+    def temperature_summary(self):
+        """Batch count, mean efficiency and mean degradation index per extraction temperature"""
+        return self._read_summary('batch_temperature_summary', 'extraction_temp_c')
+
+    def dashboard_kpis(self):
+        """
+        Headline numbers for the dashboard, read from the monthly summary
+
+        Deltas compare the latest month with the one before it (None when
+        there is no earlier month).
+        """
+        with self.connection() as conn:
+            totals = conn.execute("""
+                SELECT COALESCE(SUM(batch_count), 0),
+                       SUM(efficiency_sum) / NULLIF(SUM(efficiency_count), 0),
+                       SUM(degradation_sum) / NULLIF(SUM(degradation_count), 0)
+                FROM batch_monthly_summary
+            """).fetchone()
+        months = self.monthly_summary().tail(2)
+
+        def delta(column):
+            if len(months) < 2:
+                return None
+            return float(months[column].iloc[-1] - months[column].iloc[-2])
+
+        return {
+            'total_batches': int(totals[0]),
+            'mean_efficiency': totals[1],
+            'mean_degradation_index': totals[2],
+            'batch_count_delta': delta('batch_count'),
+            'efficiency_delta': delta('mean_efficiency'),
+            'degradation_index_delta': delta('mean_degradation_index')
+        }
+
+    def recent_batches(self, limit=20, strain=None, status=None):
+        """Most recent batches by date, optionally filtered (index-backed)"""
+        filters, params = [], []
+        if strain is not None:
+            filters.append("strain = ?")
+            params.append(strain)
+        if status is not None:
+            filters.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(filters)} " if filters else ""
+        return self.read_sql(f"SELECT * FROM batches {where}ORDER BY date DESC LIMIT ?",
+                             params=params + [limit])
+
+    def read_sql(self, sql, params=None):
+        """DataFrame from a query on a pooled connection"""
+        with self.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def _read_summary(self, table, key):
+        return self.read_sql(f"""
+            SELECT {key}, batch_count,
+                   efficiency_sum / NULLIF(efficiency_count, 0) AS mean_efficiency,
+                   degradation_sum / NULLIF(degradation_count, 0) AS mean_degradation_index
+            FROM {table}
+            WHERE batch_count > 0
+            ORDER BY {key}
+        """)
+
+    def fetch_batches_since(self, last_seq=0, columns=None, limit=None):
+        """
+        Return batches inserted or changed after a change_seq watermark, oldest first
 
-    def calculate_metrics(self, data):
-        """Calculate all derived metrics"""
+        Every upsert that changes a batch moves it to the next change_seq,
+        so corrected and re-imported batches come back too. The result
+        always includes a change_seq column so callers can advance their
+        watermark to its max.
+        """
+        columns = columns or BATCH_COLUMNS
+        unknown = set(columns) - set(BATCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown batch columns: {sorted(unknown)}")
+
+        return self.read_sql(
+            f"SELECT change_seq, {', '.join(columns)} FROM batches "
+            "WHERE change_seq > ? ORDER BY change_seq LIMIT ?",
+            params=(last_seq, -1 if limit is None else limit)
+        )
+
+    def fetch_batches_created_since(self, created_at=None, last_rowid=0, columns=None, limit=None):
+        """
+        Return batches created after a (created_at, rowid) watermark
+
+        rowid breaks ties between rows sharing a created_at second. Rows come
+        back in watermark order with rowid included.
+        """
+        columns = columns or BATCH_COLUMNS
+        unknown = set(columns) - set(BATCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown batch columns: {sorted(unknown)}")
+
+        created_at = created_at or ''
+        return self.read_sql(
+            f"SELECT rowid AS rowid, {', '.join(columns)} FROM batches "
+            "WHERE created_at > ? OR (created_at = ? AND rowid > ?) "
+            "ORDER BY created_at, rowid LIMIT ?",
+            params=(created_at, created_at, last_rowid, -1 if limit is None else limit)
+        )
+
+    def save_batch(self, record):
+        """
+        Upsert one batch in a single pooled transaction
+
+        Derived metrics are computed when raw cannabinoid results are given.
+        Raises ValueError for a missing batch ID or non-numeric values.
+        """
+        row = dict(record)
+        if any(name in row for name in CANNABINOID_COLUMNS):
+            row = self.calculate_metrics(row)
+            row.setdefault('total_cbd', row.get('cbd'))
+
+        if not row.get('batch_id'):
+            raise ValueError("batch_id is required")
+        for name in NUMERIC_COLUMNS:
+            value = row.get(name)
+            if isinstance(value, np.generic):
+                value = row[name] = value.item()
+            if value is not None and not isinstance(value, (int, float)):
+                raise ValueError(f"Non-numeric value for {name}: {value!r}")
+
+        columns = tuple(c for c in BATCH_COLUMNS if c in row and c != 'created_at')
+        with self.transaction() as conn:
+            conn.execute(_upsert_sql(columns), [row[c] for c in columns])
+        return row
+
+    def ingest_batches(self, records, chunk_size=1000):
+        """
+        Bulk upsert batches from a list of dicts or a DataFrame
+
+        Metrics are derived in vectorized form, rows are validated up front
+        (numeric columns must be numbers, dates must parse in any common
+        format and are normalized to YYYY-MM-DD),
+        and valid rows are written with executemany, one transaction per
+        chunk. A chunk that fails is retried row by row, so bad rows are
+        reported without aborting the load.
+
+        Returns: {'written': n, 'errors': [{'row', 'batch_id', 'error'}]}
+        """
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+        df = df.reset_index(drop=True)
+        errors = []
+
+        def reject(mask, message):
+            for i in np.flatnonzero(mask):
+                batch_id = df.at[i, 'batch_id'] if 'batch_id' in df else None
+                errors.append({'row': int(i), 'batch_id': None if pd.isna(batch_id) else batch_id,
+                               'error': message(i)})
+
+        if 'batch_id' in df:
+            missing_id = df['batch_id'].isna().to_numpy() | (df['batch_id'].astype(str).str.strip() == '').to_numpy()
+        else:
+            missing_id = np.ones(len(df), dtype=bool)
+        reject(missing_id, lambda i: "batch_id is required")
+
+        valid = ~missing_id
+        for name in df.columns.intersection(NUMERIC_COLUMNS + CANNABINOID_COLUMNS):
+            numeric = pd.to_numeric(df[name], errors='coerce')
+            bad = (numeric.isna() & df[name].notna()).to_numpy() & valid
+            reject(bad, lambda i, name=name: f"Non-numeric value for {name}: {df.at[i, name]!r}")
+            valid &= ~bad
+            df[name] = numeric
+
+        if 'date' in df:
+            # Stored as YYYY-MM-DD; the monthly summary keys on its first 7 characters
+            dates = _parse_dates(df['date'])
+            bad = (dates.isna() & df['date'].notna()).to_numpy() & valid
+            reject(bad, lambda i: f"Unrecognized date: {df.at[i, 'date']!r}")
+            valid &= ~bad
+            df['date'] = dates.dt.strftime('%Y-%m-%d')
+
+        if df.columns.intersection(CANNABINOID_COLUMNS).size:
+            df = self.calculate_metrics_frame(df)
+            if 'total_cbd' not in df and 'cbd' in df:
+                df['total_cbd'] = df['cbd']
+
+        columns = tuple(c for c in BATCH_COLUMNS if c in df and c != 'created_at')
+        rows = df.loc[valid, list(columns)]
+        index = rows.index.to_numpy()
+        values = list(rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None))
+
+        sql = _upsert_sql(columns)
+        written = 0
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            try:
+                with self.transaction() as conn:
+                    conn.executemany(sql, chunk)
+                written += len(chunk)
+            except sqlite3.Error:
+                # Isolate the offending rows; the rest of the chunk still loads
+                for i, row in zip(index[start:start + chunk_size], chunk):
+                    try:
+                        with self.transaction() as conn:
+                            conn.execute(sql, row)
+                        written += 1
+                    except sqlite3.Error as e:
+                        errors.append({'row': int(i), 'batch_id': row[0], 'error': str(e)})
+
+        errors.sort(key=lambda error: error['row'])
+        return {'written': written, 'errors': errors}
+
+    def save_anomaly_scores(self, batch_ids, scores):
+        """Upsert anomaly scores (negative = anomaly) for the given batches"""
+        rows = [(batch_id, float(score), int(score < 0)) for batch_id, score in zip(batch_ids, scores)]
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO anomaly_scores (batch_id, score, is_anomaly) VALUES (?, ?, ?) "
+                "ON CONFLICT(batch_id) DO UPDATE SET score = excluded.score, "
+                "is_anomaly = excluded.is_anomaly, scored_at = CURRENT_TIMESTAMP",
+                rows
+            )
+
+    def get_anomaly_scores(self, anomalies_only=False, limit=None):
+        """Stored anomaly scores joined with the batch metrics, newest first"""
+        return self.read_sql(
+            "SELECT s.batch_id, b.extraction_efficiency, b.degradation_index, "
+            "s.score, s.is_anomaly, s.scored_at "
+            "FROM anomaly_scores s JOIN batches b USING (batch_id) "
+            f"{'WHERE s.is_anomaly = 1 ' if anomalies_only else ''}"
+            "ORDER BY b.change_seq DESC LIMIT ?",
+            params=(-1 if limit is None else limit,)
+        )
+
+    def last_scored_seq(self):
+        """Highest batches change_seq that has an anomaly score for its current values"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT MAX(b.change_seq) FROM batches b JOIN anomaly_scores s USING (batch_id)"
+            ).fetchone()
+        return row[0] or 0
+
+    @staticmethod
+    def calculate_metrics(data):
+        """Calculate all derived metrics (pure, never touches the database)"""
         # Total cannabinoids
         data['total_cannabinoids'] = (
             data.get('d9_thc', 0) + data.get('d8_thc', 0) + 
@@ -76,8 +545,116 @@ class DataProcessor:
 
         return data
 
+    @staticmethod
+    def calculate_metrics_frame(df):
+        """
+        Columnar calculate_metrics for a whole DataFrame of lab results
+
+        Missing cannabinoid columns and NaN cells (a key absent from one
+        record, a blank CSV cell) count as 0 and ratios with a zero
+        denominator are 0, matching the scalar version row for row.
+        Returns a copy of df with the derived metric columns added.
+        """
+        def column(name):
+            if name in df:
+                return np.nan_to_num(df[name].to_numpy(dtype=float), nan=0.0)
+            return np.zeros(len(df))
+
+        d9, d8 = column('d9_thc'), column('d8_thc')
+        cbn = column('cbn')
+        total_thc = d9 + d8
+
+        metrics = pd.DataFrame({
+            'total_cannabinoids': d9 + d8 + column('cbd') + column('cbg') + cbn + column('cbc'),
+            'total_thc': total_thc,
+            'degradation_index': _safe_percent(cbn, total_thc),
+            'isomerization_ratio': _safe_percent(d8, d9)
+        }, index=df.index)
+
+        # concat is much cheaper than assign on wide frames; replace stale metrics first
+        stale = df.columns.intersection(metrics.columns)
+        if len(stale):
+            df = df.drop(columns=stale)
+        return pd.concat([df, metrics], axis=1)
+
+
+def _parse_dates(values):
+    """Datetimes for a column of dates in mixed formats, NaT where none parses"""
+    # ISO dates parse vectorized; only the rest go through per-value inference
+    parsed = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    rest = parsed.isna() & values.notna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(values[rest], format='mixed', errors='coerce')
+    return parsed
+
+
+def _safe_percent(numerator, denominator):
+    """numerator / denominator * 100, or 0 where the denominator is not > 0"""
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator),
+                     where=denominator > 0) * 100
+
+
+def _summary_triggers():
+    """
+    Triggers keeping the summary tables in step with batches
+
+    Each summary row holds counts and sums so inserts, updates (including
+    upserts) and deletes can adjust it without rescanning batches.
+    """
+    statements = []
+    for table, key in SUMMARY_TABLES.items():
+        key_name, key_expr = key.split()[0], SUMMARY_KEYS[table]
+        for event, rows in (('INSERT', [('NEW', 1)]),
+                            ('UPDATE', [('OLD', -1), ('NEW', 1)]),
+                            ('DELETE', [('OLD', -1)])):
+            body = []
+            for row, sign in rows:
+                k = key_expr.format(row=row)
+                if sign > 0:
+                    # Not INSERT OR IGNORE: an upsert's own conflict handling
+                    # overrides it inside the trigger and the insert aborts
+                    body.append(f"INSERT INTO {table} ({key_name}) SELECT {k} WHERE {k} IS NOT NULL "
+                                f"AND NOT EXISTS (SELECT 1 FROM {table} WHERE {key_name} = {k});")
+                body.append(f"""
+                    UPDATE {table} SET
+                        batch_count = batch_count + {sign},
+                        efficiency_sum = efficiency_sum + {sign} * COALESCE({row}.extraction_efficiency, 0),
+                        efficiency_count = efficiency_count + {sign} * ({row}.extraction_efficiency IS NOT NULL),
+                        degradation_sum = degradation_sum + {sign} * COALESCE({row}.degradation_index, 0),
+                        degradation_count = degradation_count + {sign} * ({row}.degradation_index IS NOT NULL)
+                    WHERE {key_name} = {k};""")
+            # Recreated on startup so databases with older trigger bodies pick up fixes
+            statements.append(f"DROP TRIGGER IF EXISTS trg_{table}_{event.lower()}")
+            statements.append(
+                f"CREATE TRIGGER trg_{table}_{event.lower()} AFTER {event} ON batches "
+                f"BEGIN {' '.join(body)} END"
+            )
+    return statements
+
+
+@functools.lru_cache(maxsize=64)
+def _upsert_sql(columns):
+    """
+    INSERT ... ON CONFLICT(batch_id) DO UPDATE for a tuple of batches columns
+
+    Inserted and changed rows take the next change_seq. An upsert that
+    changes nothing leaves the row alone, so re-imports of unchanged
+    batches don't fire triggers or look new to incremental consumers.
+    """
+    values = ', '.join('?' * len(columns))
+    next_seq = "(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM batches)"
+    updated = [c for c in columns if c != 'batch_id']
+    if updated:
+        updates = ', '.join(f"{c} = excluded.{c}" for c in updated)
+        changed = ' OR '.join(f"batches.{c} IS NOT excluded.{c}" for c in updated)
+        conflict = f"DO UPDATE SET {updates}, change_seq = excluded.change_seq WHERE {changed}"
+    else:
+        conflict = "DO NOTHING"
+    return (f"INSERT INTO batches ({', '.join(columns)}, change_seq) "
+            f"VALUES ({values}, {next_seq}) "
+            f"ON CONFLICT(batch_id) {conflict}")
+
 
 def calculate_metrics_standalone(data):
     """Standalone metric calculation"""
-    processor = DataProcessor()
-    return processor.calculate_metrics(data)
+    return DataProcessor.calculate_metrics(data)
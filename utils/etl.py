@@ -0,0 +1,124 @@
+"""
+Streaming ETL for historical DoE workbooks and lab exports
+Reads Excel/CSV files in row chunks and feeds them into bulk batch inserts
+"""
+
+import os
+import re
+import pandas as pd
+from utils.data_processor import DataProcessor, BATCH_COLUMNS, CANNABINOID_COLUMNS
+
+# Normalized spreadsheet headers -> batches / lab-result columns
+COLUMN_ALIASES = {
+    'batch': 'batch_id',
+    'lot': 'batch_id',
+    'lot_id': 'batch_id',
+    'analyst': 'technician',
+    'tech': 'technician',
+    'material': 'material_type',
+    'weight': 'initial_weight_g',
+    'initial_weight': 'initial_weight_g',
+    'moisture': 'moisture_content',
+    'temp': 'extraction_temp_c',
+    'temperature': 'extraction_temp_c',
+    'extraction_temp': 'extraction_temp_c',
+    'time': 'extraction_time_min',
+    'extraction_time': 'extraction_time_min',
+    'final_weight': 'final_weight_g',
+    'efficiency': 'extraction_efficiency',
+    'yield': 'process_yield',
+    'd9': 'd9_thc',
+    'd9thc': 'd9_thc',
+    'd8': 'd8_thc',
+    'd8thc': 'd8_thc'
+}
+
+KNOWN_COLUMNS = set(BATCH_COLUMNS) | set(CANNABINOID_COLUMNS)
+
+
+def normalize_header(header):
+    """'Temp (°C)' -> 'temp', 'Δ9-THC' -> 'd9_thc', 'Batch ID' -> 'batch_id'"""
+    text = str(header).strip().lower().replace('δ', 'd')
+    text = re.sub(r'\(.*?\)', '', text)
+    return re.sub(r'[^a-z0-9]+', '_', text).strip('_')
+
+
+def map_columns(df):
+    """Rename spreadsheet headers to schema columns and drop the rest"""
+    renamed = {}
+    for header in df.columns:
+        name = normalize_header(header)
+        name = COLUMN_ALIASES.get(name, name)
+        if name in KNOWN_COLUMNS and name not in renamed.values():
+            renamed[header] = name
+    # Values are validated (and dates normalized) by ingest_batches
+    return df[list(renamed)].rename(columns=renamed)
+
+
+def iter_csv_chunks(source, chunk_size=5_000):
+    """Yield DataFrames of chunk_size rows from a CSV path or file object"""
+    yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, skipinitialspace=True)
+
+
+def iter_excel_chunks(source, sheet_name=None, chunk_size=5_000):
+    """
+    Yield DataFrames of chunk_size rows from an .xlsx path or file object
+
+    Uses openpyxl read-only mode, which streams rows from the archive instead
+    of building the whole workbook in memory. The first non-empty row is the
+    header.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        header = None
+        rows = []
+        for values in sheet.iter_rows(values_only=True):
+            if all(v is None for v in values):
+                continue
+            if header is None:
+                header = [f"column_{i}" if v is None else str(v) for i, v in enumerate(values)]
+                continue
+            rows.append(values[:len(header)])
+            if len(rows) >= chunk_size:
+                yield pd.DataFrame(rows, columns=header)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_file_chunks(source, sheet_name=None, chunk_size=5_000, file_type=None):
+    """Chunk iterator for a CSV or Excel source, picked by file_type or extension"""
+    if file_type is None:
+        name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+        file_type = os.path.splitext(str(name))[1].lstrip('.').lower()
+    if file_type in ('xlsx', 'xlsm'):
+        return iter_excel_chunks(source, sheet_name, chunk_size)
+    if file_type in ('csv', 'txt'):
+        return iter_csv_chunks(source, chunk_size)
+    raise ValueError(f"Unsupported file type: '{file_type}'")
+
+
+def load_file(source, processor=None, sheet_name=None, chunk_size=5_000, file_type=None):
+    """
+    Stream a workbook or CSV into the batches table chunk by chunk
+
+    Only one chunk is held in memory at a time. Returns the combined
+    ingest report, with error row numbers counted from the first data row.
+    """
+    processor = processor or DataProcessor()
+    report = {'rows': 0, 'written': 0, 'errors': []}
+
+    for chunk in iter_file_chunks(source, sheet_name, chunk_size, file_type):
+        result = processor.ingest_batches(map_columns(chunk), chunk_size=chunk_size)
+        for error in result['errors']:
+            error['row'] += report['rows']
+        report['errors'].extend(result['errors'])
+        report['written'] += result['written']
+        report['rows'] += len(chunk)
+
+    return report
@@ -0,0 +1,171 @@
+"""
+Model Registry
+Versioned storage of trained models under models/ with metadata and a
+process-wide cache
+"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+from datetime import datetime
+import numpy as np
+import joblib
+
+# MODELS_DIR in the environment points the default registry elsewhere
+MODELS_DIR = (os.environ.get('MODELS_DIR')
+              or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models'))
+
+
+class ModelRegistry:
+    """
+    Stores each model as <name>-v<version>.joblib next to a <name>.json
+    metadata file pointing at the current version
+
+    Loaded models are cached per process, so Streamlit reruns and sessions
+    reuse the same object instead of unpickling it again.
+
+    mmap_mode is passed to joblib.load. It only keeps plain ndarray
+    attributes mapped: sklearn trees copy their node arrays into their own
+    memory when unpickled, so forest models gain nothing from it and it is
+    off by default.
+
+    Only the newest keep_versions files per model are kept (None keeps
+    every version).
+    """
+
+    def __init__(self, root=MODELS_DIR, mmap_mode=None, keep_versions=5):
+        if keep_versions is not None and keep_versions < 1:
+            raise ValueError(f"keep_versions must be >= 1, got {keep_versions}")
+        self.root = root
+        self.mmap_mode = mmap_mode
+        self.keep_versions = keep_versions
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _metadata_path(self, name):
+        return os.path.join(self.root, f"{name}.json")
+
+    def _model_path(self, name, version):
+        return os.path.join(self.root, f"{name}-v{version}.joblib")
+
+    def metadata(self, name):
+        """Return metadata for the current version, or None if never saved"""
+        path = self._metadata_path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def save(self, name, model, X=None, y=None, feature_names=None, **extra):
+        """
+        Persist a trained model as a new version
+
+        X, y: training data, hashed so the metadata records what the model saw
+        feature_names: feature schema, defaults to model.feature_names if set
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            previous = self.metadata(name)
+            version = previous['version'] + 1 if previous else 1
+
+            # Uncompressed: loads skip decompression
+            joblib.dump(model, self._model_path(name, version))
+
+            meta = {
+                'name': name,
+                'version': version,
+                'model_class': type(model).__name__,
+                'feature_names': list(feature_names or getattr(model, 'feature_names', None) or []),
+                'training_data_hash': hash_training_data(X, y) if X is not None else None,
+                'n_samples': int(len(X)) if X is not None else None,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                **extra
+            }
+
+            # Write metadata last and atomically so readers never see a partial version
+            tmp_path = self._metadata_path(name) + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f, indent=2)
+            os.replace(tmp_path, self._metadata_path(name))
+
+            self._cache[name] = model
+            self._prune(name, version)
+            return meta
+
+    def versions(self, name):
+        """Versions of name with a model file on disk, oldest first"""
+        pattern = re.compile(rf"{re.escape(name)}-v(\d+)\.joblib")
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(match.group(1)) for match in map(pattern.fullmatch, os.listdir(self.root))
+                      if match)
+
+    def _prune(self, name, current):
+        """Delete model files older than the newest keep_versions"""
+        if self.keep_versions is None:
+            return
+        for version in self.versions(name):
+            if version <= current - self.keep_versions:
+                try:
+                    os.remove(self._model_path(name, version))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, name, factory=None, refresh=False):
+        """
+        Return the cached model, loading the current version on first use
+
+        factory: called to build a fresh (untrained) model when nothing has
+        been saved under name yet
+        refresh: bypass the cache and reload from disk
+        """
+        with self._lock:
+            if not refresh and name in self._cache:
+                return self._cache[name]
+
+            meta = self.metadata(name)
+            if meta is not None:
+                model = joblib.load(self._model_path(name, meta['version']), mmap_mode=self.mmap_mode)
+            elif factory is not None:
+                model = factory()
+            else:
+                raise FileNotFoundError(f"No saved model named '{name}' in {self.root}")
+
+            self._cache[name] = model
+            return model
+
+    def invalidate(self, name=None):
+        """Drop one (or every) cached model so the next load hits disk"""
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+
+def hash_training_data(*arrays):
+    """SHA-256 over the shape, dtype and bytes of each training array"""
+    digest = hashlib.sha256()
+    for array in arrays:
+        if array is None:
+            continue
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.shape}{array.dtype}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+# Process-wide default registry
+registry = ModelRegistry()
+
+
+def get_model(name, factory=None):
+    """Load a model once per process from the default registry"""
+    return registry.load(name, factory)
+
+
+def save_model(name, model, X=None, y=None, **metadata):
+    """Save a model as a new version in the default registry"""
+    return registry.save(name, model, X=X, y=y, **metadata)
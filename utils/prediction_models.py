@@ -4,16 +4,93 @@ AI Prediction Models for Cannabinoid Extraction
 Based on research: PNN-GA optimization [^21^], Random Forest, LSTM
 """
 
+import re
+import numbers
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
-from sklearn.svm import SVC
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 import joblib
 import warnings
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 warnings.filterwarnings('ignore')
 
+# sklearn is imported by each model's _build() on first fit (or when a trained
+# model is unpickled), so untrained heuristics never pay for loading it
+
+# Feature order expected by ExtractionOptimizer
+FEATURE_NAMES = ['temp', 'time', 'rpm', 'weight', 'moisture']
+
+# Default search space and grid spacing for optimize_parameters
+DEFAULT_BOUNDS = {
+    'temp': (-80, -40),
+    'time': (15, 25),
+    'rpm': (1000, 1400)
+}
+DEFAULT_STEPS = {'temp': 5, 'time': 2, 'rpm': 100, 'weight': 100, 'moisture': 0.1}
+DEFAULT_FIXED = {'weight': 2000, 'moisture': 1.8}
+
+# Continuous 5-D search space for evolve_parameters
+SEARCH_BOUNDS = {
+    **DEFAULT_BOUNDS,
+    'weight': (1500, 2500),
+    'moisture': (1.0, 3.0)
+}
+
+# PotencyClassifier grade rules per product type, checked in order:
+# (grade, min total cannabinoids %, max degradation %, max isomerization %).
+# Lots meeting none grade 'F'; product types not listed use 'default'
+GRADE_THRESHOLDS = {
+    'default': [
+        ('A', 90, 2, 3),
+        ('B', 85, 3, 5),
+        ('C', 80, 5, np.inf)
+    ]
+}
+
+# Regulatory limits per product type; types not listed have none
+COMPLIANCE_LIMITS = {
+    'hemp': {'min_cbd_thc_ratio': 20, 'max_total_thc': 0.3}
+}
+
+class ExecutionConfig:
+    """
+    Parallel execution settings for the sklearn-backed models
+
+    n_jobs: worker count for fit/predict (-1 = all cores)
+    backend: joblib backend, 'threading' or 'loky'
+    chunk_size: max rows per predict call on large inputs
+    min_parallel_rows: inputs smaller than this predict on one core, so
+    single-row slider predictions don't pay worker dispatch overhead
+    """
+
+    BACKENDS = ('threading', 'loky')
+
+    def __init__(self, n_jobs=-1, backend='threading', chunk_size=50_000, min_parallel_rows=1_000):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"backend must be one of {self.BACKENDS}, got '{backend}'")
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.min_parallel_rows = min_parallel_rows
+
+    def context(self, n_rows=None):
+        """joblib context for estimators built with n_jobs=None"""
+        n_jobs = 1 if n_rows is not None and n_rows < self.min_parallel_rows else self.n_jobs
+        return joblib.parallel_config(backend=self.backend, n_jobs=n_jobs)
+
+    def fit(self, estimator, *args):
+        with self.context():
+            return estimator.fit(*args)
+
+    def apply(self, func, X):
+        """Call func over row chunks of X and concatenate the results"""
+        with self.context(len(X)):
+            if len(X) <= self.chunk_size:
+                return func(X)
+            return np.concatenate([func(X[start:start + self.chunk_size])
+                                   for start in range(0, len(X), self.chunk_size)])
+
+
 class ExtractionOptimizer:
     """
     Random Forest model for optimizing extraction parameters
@@ -22,71 +99,412 @@ class ExtractionOptimizer:
     Based on DoE data from Excel workbook
     """
 
-    def __init__(self):
+    feature_names = FEATURE_NAMES
+
+    # Class-level defaults also cover models pickled before compiled inference
+    compiled = False
+    _forest = None
+
+    def __init__(self, execution=None, compiled=False):
+        """
+        compiled: serve small predictions (under execution.min_parallel_rows
+        rows) from a CompiledForest instead of sklearn's predict
+        """
+        self.execution = execution or ExecutionConfig()
+        self.compiled = compiled
+        self.model = None
+        self.scaler = None
+        self.is_trained = False
+
+    def _build(self):
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.preprocessing import StandardScaler
+
         self.model = RandomForestRegressor(
             n_estimators=100,
             max_depth=10,
             random_state=42
         )
         self.scaler = StandardScaler()
-        self.is_trained = False
 
     def train(self, X, y):
         """Train the model with historical batch data"""
+        if self.model is None:
+            self._build()
         X_scaled = self.scaler.fit_transform(X)
-        self.model.fit(X_scaled, y)
+        self.execution.fit(self.model, X_scaled, y)
         self.is_trained = True
+        self._forest = None
+
+    def partial_train(self, X, y, n_new_trees=10, max_estimators=None):
+        """
+        Incrementally update the model with new batch data
+
+        The scaler is updated with partial_fit and the forest grows by
+        n_new_trees fitted on the new rows only (warm_start), so cost scales
+        with the new rows rather than the full history. Existing trees have
+        their split thresholds rebased onto the updated scaling. When
+        max_estimators is set, the oldest trees are dropped beyond it.
+        """
+        if not self.is_trained:
+            self.train(X, y)
+            return
+
+        old_mean, old_scale = self.scaler.mean_.copy(), self.scaler.scale_.copy()
+        self.scaler.partial_fit(X)
+        _rebase_forest_thresholds(self.model, old_mean, old_scale,
+                                  self.scaler.mean_, self.scaler.scale_)
+
+        self.model.set_params(warm_start=True,
+                              n_estimators=len(self.model.estimators_) + n_new_trees)
+        self.execution.fit(self.model, self.scaler.transform(X), y)
+
+        if max_estimators is not None and len(self.model.estimators_) > max_estimators:
+            self.model.estimators_ = self.model.estimators_[-max_estimators:]
+            self.model.set_params(n_estimators=max_estimators)
+        self._forest = None
 
     def predict(self, X):
         """Predict extraction efficiency"""
         if not self.is_trained:
-            # Return simulated prediction based on heuristics
-            temp, time, rpm, weight, moisture = X[0]
+            # Return simulated prediction based on heuristics, one per row
+            X = np.atleast_2d(np.asarray(X, dtype=float))
+            temp, time = X[:, 0], X[:, 1]
             # Higher temp (less negative) = lower efficiency
             # Optimal around -60 to -80
             base_eff = 85
-            temp_bonus = abs(temp + 60) * 0.1 if temp < -60 else -abs(temp + 40) * 0.2
+            temp_bonus = np.where(temp < -60, np.abs(temp + 60) * 0.1, -np.abs(temp + 40) * 0.2)
             time_factor = -0.05 * (time - 20)**2
 
-            return np.array([base_eff + temp_bonus + time_factor])
+            return base_eff + temp_bonus + time_factor
+
+        if self.compiled:
+            X = np.atleast_2d(np.asarray(X, dtype=float))
+            if len(X) < self.execution.min_parallel_rows:
+                return self.compiled_forest().predict(X)
 
         X_scaled = self.scaler.transform(X)
-        return self.model.predict(X_scaled)
+        return self.execution.apply(self.model.predict, X_scaled)
+
+    def compiled_forest(self):
+        """CompiledForest of the trained model, rebuilt after each (re)training"""
+        if self._forest is None:
+            self._forest = CompiledForest(self.model, self.scaler)
+        return self._forest
 
-    def optimize_parameters(self, bounds=None):
+    def optimize_parameters(self, bounds=None, steps=None, fixed=None, chunk_size=100_000):
         """
-        Genetic Algorithm optimization (simplified)
-        Returns optimal temp, time, rpm
+        Vectorized grid search over extraction parameters
+        Returns optimal temp, time, rpm (see evolve_parameters for the GA)
+
+        bounds: {feature: (low, high)} for any of FEATURE_NAMES to search
+        steps: {feature: step} grid spacing, smaller steps give finer grids
+        fixed: {feature: value} for features that are not searched; any
+        left out use DEFAULT_FIXED or the midpoint of SEARCH_BOUNDS
+        chunk_size: max candidate rows scored per predict call
         """
         if bounds is None:
-            bounds = {
-                'temp': (-80, -40),
-                'time': (15, 25),
-                'rpm': (1000, 1400)
-            }
-
-        # Grid search for optimal (simplified GA)
-        best_score = 0
+            bounds = DEFAULT_BOUNDS
+        steps = {**DEFAULT_STEPS, **(steps or {})}
+        fixed = _fixed_values(bounds, fixed)
+
+        # One axis per searched feature, inclusive of the upper bound
+        axes = {}
+        for name, (low, high) in bounds.items():
+            step = steps.get(name, (high - low) / 10 or 1)
+            axes[name] = np.arange(low, high + step / 2, step)
+
+        names = list(axes)
+        shape = tuple(len(axes[name]) for name in names)
+        n_candidates = int(np.prod(shape))
+
+        best_score = -np.inf
         best_params = None
 
-        for temp in range(-80, -39, 5):
-            for time in range(15, 26, 2):
-                for rpm in range(1000, 1401, 100):
-                    score = self.predict(np.array([[temp, time, rpm, 2000, 1.8]]))[0]
-                    if score > best_score:
-                        best_score = score
-                        best_params = {'temp': temp, 'time': time, 'rpm': rpm}
+        # Build candidate rows chunk by chunk so memory stays bounded
+        for start in range(0, n_candidates, chunk_size):
+            idx = np.arange(start, min(start + chunk_size, n_candidates))
+            coords = np.unravel_index(idx, shape)
+
+            X = np.empty((len(idx), len(FEATURE_NAMES)))
+            for col, feature in enumerate(FEATURE_NAMES):
+                if feature in axes:
+                    X[:, col] = axes[feature][coords[names.index(feature)]]
+                else:
+                    X[:, col] = fixed[feature]
+
+            scores = self.predict(X)
+            i = int(np.argmax(scores))
+            if scores[i] > best_score:
+                best_score = float(scores[i])
+                best_params = {name: X[i, FEATURE_NAMES.index(name)].item() for name in names}
 
         return best_params, best_score
 
+    def evolve_parameters(self, bounds=None, fixed=None, population_size=64,
+                          generations=40, elite_fraction=0.1, mutation_scale=0.1,
+                          patience=8, tol=1e-4, seed=None, n_workers=None):
+        """
+        Genetic Algorithm optimization over continuous parameters
+        Returns optimal params, score and per-generation convergence history
+
+        Each generation is scored with one batched predict call; n_workers > 1
+        splits it across that many worker processes, which receive the model
+        once when the pool starts, so only population chunks and scores cross
+        processes each generation (worth it for large populations of a
+        trained forest, not the default 64). Stops early once the best score
+        has not improved by more than tol for patience generations. Features
+        not in bounds are held at the same values as in optimize_parameters.
+        """
+        if bounds is None:
+            bounds = SEARCH_BOUNDS
+        if generations < 0:
+            raise ValueError(f"generations must be >= 0, got {generations}")
+        fixed = _fixed_values(bounds, fixed)
+
+        rng = np.random.default_rng(seed)
+        names = list(bounds)
+        cols = [FEATURE_NAMES.index(name) for name in names]
+        low = np.array([bounds[name][0] for name in names], dtype=float)
+        high = np.array([bounds[name][1] for name in names], dtype=float)
+        span = high - low
+
+        base = np.array([fixed.get(name, np.nan) for name in FEATURE_NAMES], dtype=float)
+
+        with _population_scorer(self, n_workers) as predict:
+            def score(genes):
+                X = np.tile(base, (len(genes), 1))
+                X[:, cols] = genes
+                return predict(X)
+
+            n_elite = max(1, int(round(population_size * elite_fraction)))
+            population = low + rng.random((population_size, len(names))) * span
+            fitness = score(population)
+            evaluations = population_size
+
+            history = []
+            best_score = -np.inf
+            best_genes = None
+            stale = 0
+
+            # Generation 0 is the initial population; each later one is bred from
+            # the previous, so its children are checked before the loop ends
+            for generation in range(generations + 1):
+                i = int(np.argmax(fitness))
+                improved = fitness[i] > best_score + tol
+                if fitness[i] > best_score:
+                    best_score = float(fitness[i])
+                    best_genes = population[i].copy()
+                stale = 0 if improved else stale + 1
+
+                history.append({
+                    'generation': generation,
+                    'best': best_score,
+                    'mean': float(np.mean(fitness)),
+                    'evaluations': evaluations
+                })
+                if stale >= patience or generation == generations:
+                    break
+
+                # Tournament selection of parents
+                n_children = population_size - n_elite
+                contenders = rng.integers(0, population_size, size=(2, n_children, 2))
+                winners = np.where(fitness[contenders[..., 0]] >= fitness[contenders[..., 1]],
+                                   contenders[..., 0], contenders[..., 1])
+                parents_a, parents_b = population[winners[0]], population[winners[1]]
+
+                # Blend crossover (BLX-0.5) and Gaussian mutation, clipped to bounds
+                alpha = rng.uniform(-0.5, 1.5, size=parents_a.shape)
+                children = parents_a + alpha * (parents_b - parents_a)
+                children += rng.normal(0, mutation_scale, size=children.shape) * span
+                children = np.clip(children, low, high)
+
+                elite = np.argsort(fitness)[-n_elite:]
+                population = np.vstack([population[elite], children])
+                fitness = np.concatenate([fitness[elite], score(children)])
+                evaluations += n_children
+
+        best_params = {name: best_genes[j].item() for j, name in enumerate(names)}
+        return best_params, best_score, history
+
     def save(self, filepath):
         joblib.dump({'model': self.model, 'scaler': self.scaler}, filepath)
 
-    def load(self, filepath):
-        data = joblib.load(filepath)
+    def load(self, filepath, mmap_mode=None):
+        data = joblib.load(filepath, mmap_mode=mmap_mode)
         self.model = data['model']
         self.scaler = data['scaler']
         self.is_trained = True
+        self._forest = None
+
+
+class CompiledForest:
+    """
+    Array form of a fitted RandomForestRegressor for low-latency predictions
+
+    Every tree's nodes are flattened into contiguous arrays (feature,
+    threshold, children, value) and all trees are walked together, one
+    vectorized step per level, with no input validation or joblib dispatch.
+    Leaves loop back to themselves, so every tree can take max depth steps.
+
+    Node i occupies slots 2i and 2i + 1 and children holds slot indices, so
+    the next slot is children[slot + went_left] without any arithmetic on
+    node ids. Inputs go through the fitted scaler and the float32 cast
+    sklearn's trees apply, and tree outputs are summed in tree order, so
+    predictions match RandomForestRegressor.predict exactly.
+    """
+
+    def __init__(self, forest, scaler):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        offsets = np.concatenate([[0], np.cumsum([tree.node_count for tree in trees])])
+        n_nodes = int(offsets[-1])
+
+        feature = np.empty(n_nodes, dtype=np.intp)
+        threshold = np.empty(n_nodes)
+        value = np.empty(n_nodes)
+        # NaN routing per split (sklearn >= 1.3); older trees send NaN right
+        missing_left = np.zeros(n_nodes, dtype=bool)
+        # Column 0 when x > threshold (or NaN), column 1 when x <= threshold
+        children = np.empty((n_nodes, 2), dtype=np.intp)
+
+        for tree, offset in zip(trees, offsets):
+            nodes = slice(offset, offset + tree.node_count)
+            own = np.arange(offset, offset + tree.node_count)
+            leaf = tree.children_left == -1
+            feature[nodes] = np.where(leaf, 0, tree.feature)
+            threshold[nodes] = np.where(leaf, np.inf, tree.threshold)
+            children[nodes, 0] = np.where(leaf, own, tree.children_right + offset)
+            children[nodes, 1] = np.where(leaf, own, tree.children_left + offset)
+            value[nodes] = tree.value[:, 0, 0]
+            if hasattr(tree, 'missing_go_to_left'):
+                missing_left[nodes] = tree.missing_go_to_left.astype(bool)
+
+        self.feature = np.repeat(feature, 2)
+        self.threshold = np.repeat(threshold, 2)
+        self.value = np.repeat(value, 2)
+        self.missing_left = np.repeat(missing_left, 2)
+        self.children = 2 * children.ravel()
+        self.roots = 2 * offsets[:-1].astype(np.intp)
+        self.depth = max(tree.max_depth for tree in trees)
+        self.n_trees = len(trees)
+
+        self.mean = np.array(scaler.mean_, dtype=float)
+        self.scale = np.array(scaler.scale_, dtype=float)
+
+    def predict(self, X):
+        """Forest prediction per row of X (raw, unscaled features)"""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        X32 = ((X - self.mean) / self.scale).astype(np.float32).ravel()
+        feature, threshold, children = self.feature, self.threshold, self.children
+
+        if len(X) == 1:
+            rows = None
+            slots = self.roots
+        else:
+            # (n_trees, n_rows) slots; row offsets index the flattened X32
+            rows = np.arange(len(X)) * X.shape[1]
+            slots = np.repeat(self.roots[:, None], len(X), axis=1)
+
+        with_missing = bool(np.isnan(X32).any())
+        for _ in range(self.depth):
+            x = X32[feature[slots] if rows is None else rows + feature[slots]]
+            went_left = x <= threshold[slots]
+            if with_missing:
+                went_left = np.where(np.isnan(x), self.missing_left[slots], went_left)
+            slots = children[slots + went_left]
+
+        # Sequential sum over trees, as sklearn accumulates them
+        leaf_values = self.value[slots].reshape(self.n_trees, -1)
+        return np.add.accumulate(leaf_values, axis=0)[-1] / self.n_trees
+
+
+class KineticRateModel:
+    """
+    First-order degradation rate constants fitted from stability studies
+    Model: ln THC(t) = ln THC0 - k * t / 12 (t in months), per condition,
+    plus an Arrhenius fit ln k = ln A - Ea / (R * T) across conditions
+    to interpolate k at arbitrary storage temperatures
+    """
+
+    GAS_CONSTANT = 8.314  # J/(mol*K)
+
+    def __init__(self):
+        self.rates = {}          # condition -> fitted k
+        self.temperatures = {}   # condition -> storage temp (°C)
+        self.arrhenius = None    # (ln_A, Ea) once two or more conditions are known
+
+    @classmethod
+    def from_rates(cls, rates, temperatures):
+        """Seed with known per-condition rates instead of study data"""
+        model = cls()
+        model.rates = dict(rates)
+        model.temperatures = dict(temperatures)
+        model.fit_arrhenius()
+        return model
+
+    def fit(self, conditions, temps_c, months, thc, lots=None):
+        """
+        Vectorized least-squares fit of k for every condition at once
+
+        All arguments are equal-length columns of a stability study. Each
+        (condition, lot) series gets its own intercept (THC0) while lots in
+        the same condition share one rate constant. Raises ValueError when a
+        condition has no series with two or more distinct time points, since
+        its rate would be 0/0.
+        """
+        conditions = np.asarray(conditions)
+        t = np.asarray(months, dtype=float) / 12
+        y = np.log(np.asarray(thc, dtype=float))
+        temps_c = np.asarray(temps_c, dtype=float)
+
+        cond_codes, labels = pd.factorize(conditions)
+        if lots is None:
+            series_codes = cond_codes
+        else:
+            series_codes = pd.factorize(pd.MultiIndex.from_arrays([conditions, np.asarray(lots)]))[0]
+
+        # A rate needs time spread within at least one series of the condition
+        t_min = np.full(series_codes.max() + 1, np.inf)
+        t_max = np.full(series_codes.max() + 1, -np.inf)
+        np.minimum.at(t_min, series_codes, t)
+        np.maximum.at(t_max, series_codes, t)
+        series_condition = np.empty(len(t_min), dtype=np.intp)
+        series_condition[series_codes] = cond_codes
+        spread = np.bincount(series_condition, t_max > t_min, minlength=len(labels)) > 0
+        if not spread.all():
+            raise ValueError("Cannot fit a rate for conditions with a single time point per series: "
+                             f"{', '.join(map(str, labels[~spread]))}")
+
+        # Demean within each series, then one slope per condition
+        n_series = np.bincount(series_codes)
+        t_dm = t - (np.bincount(series_codes, t) / n_series)[series_codes]
+        y_dm = y - (np.bincount(series_codes, y) / n_series)[series_codes]
+        slopes = np.bincount(cond_codes, t_dm * y_dm) / np.bincount(cond_codes, t_dm * t_dm)
+        mean_temps = np.bincount(cond_codes, temps_c) / np.bincount(cond_codes)
+
+        for label, slope, temp in zip(labels, slopes, mean_temps):
+            self.rates[label] = float(-slope)
+            self.temperatures[label] = float(temp)
+        self.fit_arrhenius()
+        return self
+
+    def fit_arrhenius(self):
+        """Fit ln k against 1/T over conditions with positive rates"""
+        known = [c for c in self.rates if c in self.temperatures and self.rates[c] > 0]
+        if len(known) < 2:
+            self.arrhenius = None
+            return
+        inv_t = np.array([1 / (self.temperatures[c] + 273.15) for c in known])
+        ln_k = np.log([self.rates[c] for c in known])
+        slope, ln_a = np.polyfit(inv_t, ln_k, 1)
+        self.arrhenius = (float(ln_a), float(-slope * self.GAS_CONSTANT))
+
+    def rate_at(self, temp_c):
+        """Interpolated rate constant(s) at storage temperature(s) in °C"""
+        if self.arrhenius is None:
+            raise ValueError("Arrhenius parameters not fitted; need two or more conditions")
+        ln_a, ea = self.arrhenius
+        return np.exp(ln_a - ea / (self.GAS_CONSTANT * (np.asarray(temp_c, dtype=float) + 273.15)))
 
 
 class DegradationPredictor:
@@ -96,12 +514,70 @@ class DegradationPredictor:
     Predicts CBN formation and shelf-life
     """
 
+    default_rate = 0.3
+    cbn_conversion = 0.3
+
     def __init__(self):
-        self.degradation_rates = {
-            'Room Temp (20°C)': 0.5,  # % per month
-            'Refrigerated (4°C)': 0.2,
-            'Frozen (-20°C)': 0.05
-        }
+        self.kinetics = KineticRateModel.from_rates(
+            {
+                'Room Temp (20°C)': 0.5,  # k per year (t/12 in the model)
+                'Refrigerated (4°C)': 0.2,
+                'Frozen (-20°C)': 0.05
+            },
+            {'Room Temp (20°C)': 20, 'Refrigerated (4°C)': 4, 'Frozen (-20°C)': -20}
+        )
+        self._rate_cache = {}
+
+    @property
+    def degradation_rates(self):
+        return self.kinetics.rates
+
+    def fit(self, study):
+        """
+        Fit rate constants from a stability-study DataFrame with columns
+        condition, temp_c, months, thc (and optionally lot); replaces the
+        default rates with the study's conditions
+        """
+        self.kinetics = KineticRateModel().fit(
+            study['condition'], study['temp_c'], study['months'], study['thc'],
+            study['lot'] if 'lot' in study else None
+        )
+        self._rate_cache = {}
+        return self
+
+    def rate(self, storage_temp):
+        """
+        Rate constant for a storage label or temperature
+
+        Accepts exact condition labels, their prefixes ("Room Temp"), labels
+        containing a temperature ("Warehouse (15°C)") or a numeric °C value;
+        falls back to default_rate when nothing matches.
+        """
+        if storage_temp not in self._rate_cache:
+            self._rate_cache[storage_temp] = self._resolve_rate(storage_temp)
+        return self._rate_cache[storage_temp]
+
+    def _rates(self, conditions):
+        return np.array([self.rate(c) for c in conditions])
+
+    def _resolve_rate(self, storage_temp):
+        rates = self.kinetics.rates
+        # numbers.Real also covers NumPy scalars, e.g. values from a DataFrame column
+        if isinstance(storage_temp, numbers.Real) and not isinstance(storage_temp, bool):
+            if not self.kinetics.arrhenius:
+                return self.default_rate
+            return float(self.kinetics.rate_at(float(storage_temp)))
+        if storage_temp in rates:
+            return rates[storage_temp]
+
+        matches = [c for c in rates if c.lower().startswith(storage_temp.lower())]
+        if len(matches) == 1:
+            return rates[matches[0]]
+
+        temp = re.search(r'(-?\d+(?:\.\d+)?)\s*°C', storage_temp)
+        if temp and self.kinetics.arrhenius:
+            return float(self.kinetics.rate_at(float(temp.group(1))))
+        return self.default_rate
 
     def predict_degradation(self, initial_thc, initial_cbn, storage_temp, months):
         """
@@ -111,33 +587,100 @@ class DegradationPredictor:
         THC(t) = THC0 * exp(-k*t)
         CBN(t) = CBN0 + (THC0 - THC(t)) * conversion_factor
         """
-        rate = self.degradation_rates.get(storage_temp, 0.3)
+        rate = self.rate(storage_temp)
 
         time_points = np.arange(0, months + 1)
         thc_values = initial_thc * np.exp(-rate * time_points / 12)
-        cbn_values = initial_cbn + (initial_thc - thc_values) * 0.3
+        cbn_values = initial_cbn + (initial_thc - thc_values) * self.cbn_conversion
 
         return time_points, thc_values, cbn_values
 
-    def estimate_shelf_life(self, initial_thc, threshold=0.9):
+    def predict_degradation_batch(self, initial_thc, initial_cbn, months, storage_conditions=None):
+        """
+        Forecast many lots across storage conditions in one broadcast pass
+
+        initial_thc, initial_cbn: per-lot arrays (or scalars)
+        months: horizon in months, scalar or one per lot; points past a
+        lot's horizon are NaN
+        storage_conditions: labels or °C values to forecast (any sequence,
+        including arrays and Series), defaults to every known one
+
+        Returns: time_points (T,), thc and cbn arrays shaped (lots, conditions, T)
+        """
+        thc0 = np.atleast_1d(np.asarray(initial_thc, dtype=float))
+        cbn0 = np.broadcast_to(np.asarray(initial_cbn, dtype=float), thc0.shape)
+        horizons = np.broadcast_to(np.asarray(months), thc0.shape)
+
+        time_points = np.arange(0, int(horizons.max()) + 1)
+        return (time_points,) + self._forecast(thc0, cbn0, horizons, time_points, storage_conditions)
+
+    def iter_degradation_batches(self, initial_thc, initial_cbn, months, storage_conditions=None,
+                                 chunk_size=10_000):
+        """
+        Streaming variant of predict_degradation_batch
+
+        Inputs only need to support len() and slicing (NumPy arrays, memmaps,
+        pandas Series), so very large inventories are read and forecast one
+        chunk at a time. Yields (start, time_points, thc, cbn) per chunk, with
+        the same time axis for every chunk.
+        """
+        n_lots = len(initial_thc)
+        per_lot_months = np.ndim(months) > 0
+        time_points = np.arange(0, int(np.max(months)) + 1)
+
+        for start in range(0, n_lots, chunk_size):
+            stop = min(start + chunk_size, n_lots)
+            thc0 = np.asarray(initial_thc[start:stop], dtype=float)
+            cbn0 = np.asarray(initial_cbn[start:stop], dtype=float)
+            horizons = np.asarray(months[start:stop] if per_lot_months else months)
+            horizons = np.broadcast_to(horizons, thc0.shape)
+            thc, cbn = self._forecast(thc0, cbn0, horizons, time_points, storage_conditions)
+            yield start, time_points, thc, cbn
+
+    def _forecast(self, thc0, cbn0, horizons, time_points, storage_conditions=None):
+        """First-order kinetics for (lots,) inputs over (T,) time points"""
+        conditions = list(self.degradation_rates if storage_conditions is None else storage_conditions)
+        rates = self._rates(conditions)
+
+        decay = np.exp(-rates[:, None] * time_points[None, :] / 12)   # (conditions, T)
+        thc = thc0[:, None, None] * decay[None, :, :]
+        cbn = cbn0[:, None, None] + (thc0[:, None, None] - thc) * self.cbn_conversion
+
+        beyond = (time_points[None, :] > horizons[:, None])[:, None, :]
+        if beyond.any():
+            thc = np.where(beyond, np.nan, thc)
+            cbn = np.where(beyond, np.nan, cbn)
+        return thc, cbn
+
+    def estimate_shelf_life(self, initial_thc, threshold=0.9, min_thc=None, storage_conditions=None):
         """
         Estimate shelf-life until THC degrades to threshold
 
-        Returns: months until 10% degradation
+        Closed form of THC(t) = THC0 * exp(-k*t/12) solved at the limit:
+        t = 12 * ln(THC0 / limit) / k, with limit = threshold * THC0, or the
+        absolute label claim min_thc when given (lots already below it get 0)
+
+        Returns: fractional months shaped initial_thc.shape + (conditions,),
+        conditions ordered as storage_conditions (default: all known)
         """
-        # Simplified calculation
-        for temp_name, rate in self.degradation_rates.items():
-            months_to_threshold = -12 * np.log(threshold) / rate
-            print(f"{temp_name}: {months_to_threshold:.1f} months")
+        conditions = list(self.degradation_rates if storage_conditions is None else storage_conditions)
+        rates = self._rates(conditions)
+        thc0 = np.asarray(initial_thc, dtype=float)[..., None]
 
-        return months_to_threshold
+        if min_thc is None:
+            log_ratio = np.broadcast_to(-np.log(threshold), thc0.shape)
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                log_ratio = np.maximum(np.log(thc0 / min_thc), 0)
+
+        return 12 * log_ratio / rates
 
     def predict_optimal_storage(self, target_shelf_life_months):
         """Recommend storage conditions for target shelf-life"""
         recommendations = []
+        shelf_lives = self.estimate_shelf_life(1.0)
 
-        for temp_name, rate in self.degradation_rates.items():
-            achievable_months = -12 * np.log(0.9) / rate
+        for temp_name, achievable_months in zip(self.degradation_rates, shelf_lives):
             if achievable_months >= target_shelf_life_months:
                 recommendations.append({
                     'temp': temp_name,
@@ -159,16 +702,24 @@ class AnomalyDetector:
     Isolation Forest for detecting anomalous batches
     """
 
-    def __init__(self):
+    def __init__(self, execution=None):
+        self.execution = execution or ExecutionConfig()
+        self.model = None
+        self.is_trained = False
+
+    def _build(self):
+        from sklearn.ensemble import IsolationForest
+
         self.model = IsolationForest(
             contamination=0.1,
             random_state=42
         )
-        self.is_trained = False
 
     def train(self, X):
         """Train on normal batch data"""
-        self.model.fit(X)
+        if self.model is None:
+            self._build()
+        self.execution.fit(self.model, X)
         self.is_trained = True
 
     def detect(self, X):
@@ -177,47 +728,173 @@ class AnomalyDetector:
         """
         if not self.is_trained:
             # Simple rule-based detection
-            efficiency, degradation = X[0]
-            if efficiency < 70 or degradation > 5:
-                return np.array([-1])
-            return np.array([1])
+            return np.where(self.anomaly_score(X) < 0, -1, 1)
 
-        return self.model.predict(X)
+        return self.execution.apply(self.model.predict, X)
 
     def anomaly_score(self, X):
-        """Return anomaly score (lower = more anomalous)"""
-        return self.model.decision_function(X) if self.is_trained else np.array([0])
+        """
+        Return anomaly score (lower = more anomalous, negative = anomaly)
+
+        Untrained, the score is the relative margin to the rule limits
+        (efficiency < 70 or degradation > 5) of [efficiency, degradation] rows
+        """
+        if not self.is_trained:
+            X = np.atleast_2d(np.asarray(X, dtype=float))
+            efficiency, degradation = X[:, 0], X[:, 1]
+            return np.minimum((efficiency - 70) / 70, (5 - degradation) / 5)
+        return self.execution.apply(self.model.decision_function, X)
 
 
 class PotencyClassifier:
     """
-    SVM/Neural Network for classifying product grade
-    Input: Cannabinoid profile
-    Output: Grade (A/B/C), Pass/Fail
+    SVM/Gradient Boosting model for classifying product grade
+    Input: Cannabinoid profile (total cannabinoids, degradation, isomerization)
+    Output: Grade (A/B/C/F), Pass/Fail
+
+    model_type picks the estimator:
+    'gradient_boosting': HistGradientBoostingClassifier, scales to large
+    histories and fits the threshold-shaped grade boundaries well
+    'linear_svm': LinearSVC with sigmoid-calibrated probabilities
+    'svc': kernel SVC(probability=True); training cost grows roughly
+    quadratically with rows, so keep it to small histories
+
+    Untrained, predictions fall back to the grading rules.
     """
 
-    def __init__(self):
-        self.model = SVC(probability=True, random_state=42)
-        self.scaler = StandardScaler()
+    feature_names = ['total_cannabinoids', 'degradation_index', 'isomerization_ratio']
+    MODEL_TYPES = ('gradient_boosting', 'linear_svm', 'svc')
+
+    def __init__(self, grade_thresholds=None, compliance_limits=None,
+                 model_type='gradient_boosting', execution=None):
+        if model_type not in self.MODEL_TYPES:
+            raise ValueError(f"model_type must be one of {self.MODEL_TYPES}, got '{model_type}'")
+        self.model_type = model_type
+        self.execution = execution or ExecutionConfig()
+        self.model = None
+        self.scaler = None
         self.is_trained = False
+        self.grade_thresholds = {**GRADE_THRESHOLDS, **(grade_thresholds or {})}
+        self.compliance_limits = {**COMPLIANCE_LIMITS, **(compliance_limits or {})}
+
+    def _build(self):
+        from sklearn.preprocessing import StandardScaler
+
+        if self.model_type == 'gradient_boosting':
+            from sklearn.ensemble import HistGradientBoostingClassifier
+            self.model = HistGradientBoostingClassifier(random_state=42)
+        elif self.model_type == 'linear_svm':
+            from sklearn.calibration import CalibratedClassifierCV
+            from sklearn.svm import LinearSVC
+            self.model = CalibratedClassifierCV(LinearSVC(random_state=42), cv=3)
+        else:
+            from sklearn.svm import SVC
+            self.model = SVC(probability=True, random_state=42)
+        self.scaler = StandardScaler()
+
+    @property
+    def classes_(self):
+        """Grade labels, in predict_proba column order"""
+        if self.is_trained:
+            return self.model.classes_
+        return np.array(sorted({grade for grade, *_ in self.grade_thresholds['default']} | {'F'}))
+
+    def train(self, X, y=None):
+        """
+        Train on historical lab results
 
-    def calculate_grade(self, total_cannabinoids, degradation_index, isomerization_ratio):
+        X: rows of feature_names (total cannabinoids, degradation index,
+        isomerization ratio)
+        y: recorded grades; when omitted, lots are labelled by the grading
+        rules so the model learns them from the history
+        """
+        X = np.asarray(X, dtype=float)
+        if y is None:
+            y = self.grade_batch(X[:, 0], X[:, 1], X[:, 2])[0]
+        if self.model is None:
+            self._build()
+        X_scaled = self.scaler.fit_transform(X)
+        self.execution.fit(self.model, X_scaled, np.asarray(y))
+        self.is_trained = True
+
+    def predict(self, X):
+        """Grade per row of X"""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if not self.is_trained:
+            return self.grade_batch(X[:, 0], X[:, 1], X[:, 2])[0]
+        return self.execution.apply(lambda chunk: self.model.predict(self.scaler.transform(chunk)), X)
+
+    def predict_proba(self, X):
+        """
+        Grade probabilities per row of X, columns in classes_ order
+
+        Large inputs are scaled and scored chunk by chunk (see
+        ExecutionConfig.chunk_size), so memory stays bounded. Untrained,
+        each row is one-hot on its rule-based grade.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if not self.is_trained:
+            grades = self.grade_batch(X[:, 0], X[:, 1], X[:, 2])[0]
+            return (grades[:, None] == self.classes_).astype(float)
+        return self.execution.apply(
+            lambda chunk: self.model.predict_proba(self.scaler.transform(chunk)), X
+        )
+
+    def save(self, filepath):
+        joblib.dump({'model': self.model, 'scaler': self.scaler}, filepath)
+
+    def load(self, filepath, mmap_mode=None):
+        data = joblib.load(filepath, mmap_mode=mmap_mode)
+        self.model = data['model']
+        self.scaler = data['scaler']
+        self.is_trained = True
+
+    def calculate_grade(self, total_cannabinoids, degradation_index, isomerization_ratio,
+                        product_type='default'):
         """
         Rule-based grading (can be replaced with ML model)
 
         Grade A: >90% cannabinoids, <2% degradation, <3% isomerization
         Grade B: >85% cannabinoids, <3% degradation, <5% isomerization
-        Grade C: >80% cannabinoids, <5% degradation, <10% isomerization
+        Grade C: >80% cannabinoids, <5% degradation
         Fail: <80% or >5% degradation
+        (default thresholds; see GRADE_THRESHOLDS)
         """
-        if total_cannabinoids >= 90 and degradation_index < 2 and isomerization_ratio < 3:
-            return 'A', 'Pass'
-        elif total_cannabinoids >= 85 and degradation_index < 3 and isomerization_ratio < 5:
-            return 'B', 'Pass'
-        elif total_cannabinoids >= 80 and degradation_index < 5:
-            return 'C', 'Pass'
-        else:
-            return 'F', 'Fail'
+        grade, status = self.grade_batch(total_cannabinoids, degradation_index,
+                                         isomerization_ratio, product_type)
+        return grade.item(), status.item()
+
+    def grade_batch(self, total_cannabinoids, degradation_index, isomerization_ratio,
+                    product_type='default'):
+        """
+        Vectorized calculate_grade over whole inventory columns
+
+        product_type: one type for every lot, or an array with one per lot
+        Returns (grades, status) string arrays, e.g. 'A' / 'Pass'
+        """
+        total, degradation, isomerization = np.broadcast_arrays(
+            np.asarray(total_cannabinoids, dtype=float),
+            np.asarray(degradation_index, dtype=float),
+            np.asarray(isomerization_ratio, dtype=float)
+        )
+
+        grades = np.full(total.shape, 'F')
+        failed = np.ones(total.shape, dtype=bool)
+        for kind, mask in _split_product_types(product_type):
+            rules = self.grade_thresholds.get(kind, self.grade_thresholds['default'])
+            conditions = [(total >= min_total) & (degradation < max_degradation) &
+                          (isomerization < max_isomerization)
+                          for _, min_total, max_degradation, max_isomerization in rules]
+            # Select on rule indices, then look up labels; cheaper than selecting strings
+            codes = np.select(conditions, np.arange(len(rules)), default=len(rules))
+            labels = np.array([grade for grade, *_ in rules] + ['F'])
+            if mask is None:
+                grades, failed = labels[codes], codes == len(rules)
+            else:
+                grades = np.where(mask, labels[codes], grades)
+                failed = np.where(mask, codes == len(rules), failed)
+
+        return grades, np.array(['Pass', 'Fail'])[failed.astype(np.intp)]
 
     def predict_compliance(self, cbd_thc_ratio, total_thc, product_type='hemp'):
         """
@@ -226,17 +903,105 @@ class PotencyClassifier:
         Hemp: CBD/THC > 20, Total THC < 0.3%
         Cannabis: No restrictions (but track potency)
         """
-        if product_type == 'hemp':
-            is_compliant = (cbd_thc_ratio > 20) and (total_thc < 0.3)
-            return {
-                'compliant': is_compliant,
-                'cbd_thc_check': cbd_thc_ratio > 20,
-                'thc_check': total_thc < 0.3
-            }
-        return {'compliant': True, 'note': 'Cannabis product - no THC limit'}
+        if product_type not in self.compliance_limits:
+            return {'compliant': True, 'note': 'Cannabis product - no THC limit'}
+        checks = self.compliance_batch(cbd_thc_ratio, total_thc, product_type)
+        return {key: bool(value) for key, value in checks.items()}
+
+    def compliance_batch(self, cbd_thc_ratio, total_thc, product_type='hemp'):
+        """
+        Vectorized predict_compliance over whole inventory columns
+
+        product_type: one type for every lot, or an array with one per lot
+        Returns boolean arrays {'compliant', 'cbd_thc_check', 'thc_check'};
+        lots whose product type has no limits pass every check.
+        """
+        ratio, thc = np.broadcast_arrays(np.asarray(cbd_thc_ratio, dtype=float),
+                                         np.asarray(total_thc, dtype=float))
+
+        cbd_thc_check = np.ones(ratio.shape, dtype=bool)
+        thc_check = np.ones(ratio.shape, dtype=bool)
+        for kind, mask in _split_product_types(product_type):
+            limits = self.compliance_limits.get(kind)
+            if limits is None:
+                continue
+            exempt = False if mask is None else ~mask
+            cbd_thc_check &= exempt | (ratio > limits['min_cbd_thc_ratio'])
+            thc_check &= exempt | (thc < limits['max_total_thc'])
+
+        return {
+            'compliant': cbd_thc_check & thc_check,
+            'cbd_thc_check': cbd_thc_check,
+            'thc_check': thc_check
+        }
 
 
 # Utility functions
+def _split_product_types(product_type):
+    """(type, mask) per distinct product type; mask is None for a single type"""
+    if np.ndim(product_type) == 0:
+        return [(product_type, None)]
+    types = np.asarray(product_type)
+    return [(kind, types == kind) for kind in np.unique(types)]
+
+def _fixed_values(bounds, fixed=None):
+    """
+    Value for every feature not searched in bounds
+
+    Explicit fixed values win, then DEFAULT_FIXED, then the midpoint of
+    the feature's SEARCH_BOUNDS range.
+    """
+    unknown = set(bounds) - set(FEATURE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown parameters in bounds: {sorted(unknown)}")
+    unknown = set(fixed or {}) - set(FEATURE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown parameters in fixed: {sorted(unknown)}")
+
+    defaults = {name: (low + high) / 2 for name, (low, high) in SEARCH_BOUNDS.items()}
+    values = {**defaults, **DEFAULT_FIXED, **(fixed or {})}
+    return {name: values[name] for name in FEATURE_NAMES if name not in bounds}
+
+
+# Model held by each evolve_parameters worker process, set by the pool initializer
+_worker_model = None
+
+
+def _set_worker_model(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _predict_with_worker_model(X):
+    return _worker_model.predict(X)
+
+
+@contextmanager
+def _population_scorer(model, n_workers=None):
+    """predict(X) for GA populations, split across n_workers processes when > 1"""
+    if not n_workers or n_workers <= 1:
+        yield model.predict
+        return
+
+    # The model is pickled once per worker here, not once per chunk
+    with ProcessPoolExecutor(n_workers, initializer=_set_worker_model, initargs=(model,)) as pool:
+        def predict(X):
+            chunks = np.array_split(X, min(n_workers, len(X)))
+            return np.concatenate(list(pool.map(_predict_with_worker_model, chunks)))
+        yield predict
+
+
+def _rebase_forest_thresholds(forest, old_mean, old_scale, new_mean, new_scale):
+    """Map fitted tree split thresholds from one standard scaling to another"""
+    for estimator in forest.estimators_:
+        state = estimator.tree_.__getstate__()
+        nodes = state['nodes']
+        split = nodes['left_child'] != -1
+        feature = nodes['feature'][split]
+        raw = nodes['threshold'][split] * old_scale[feature] + old_mean[feature]
+        nodes['threshold'][split] = (raw - new_mean[feature]) / new_scale[feature]
+        estimator.tree_.__setstate__(state)
+
 def calculate_degradation_index(cbn, total_thc):
     """Calculate degradation index as per CoA"""
     return (cbn / total_thc * 100) if total_thc > 0 else 0
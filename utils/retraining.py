@@ -0,0 +1,83 @@
+"""
+Incremental Retraining Pipeline
+Feeds new rows from the batches table into ExtractionOptimizer
+"""
+
+import copy
+import threading
+from utils.background import PeriodicWorker
+from utils.data_processor import DataProcessor
+from utils.model_registry import registry as default_registry
+from utils.prediction_models import ExtractionOptimizer
+
+# batches columns in ExtractionOptimizer.feature_names order
+FEATURE_COLUMNS = [
+    'extraction_temp_c', 'extraction_time_min', 'rpm',
+    'initial_weight_g', 'moisture_content'
+]
+TARGET_COLUMN = 'extraction_efficiency'
+
+
+class RetrainingPipeline(PeriodicWorker):
+    """
+    Incrementally retrains the registered ExtractionOptimizer
+
+    Each run reads batches past the change_seq watermark stored in the
+    model's registry metadata (new batches and batches corrected or
+    re-imported since), updates a copy of the model with partial_train and
+    saves it as a new version. The copy is swapped in atomically by the
+    registry, so predictions served meanwhile never see a half-trained model.
+    The registry deletes versions beyond its keep_versions, so models/ stays
+    bounded however often the pipeline runs. The first run waits one
+    interval (initial_delay) so a cold start doesn't fit a model, and import
+    sklearn, before the first page has rendered.
+    """
+
+    def __init__(self, processor=None, registry=None, model_name='extraction_optimizer',
+                 n_new_trees=10, max_estimators=500, min_rows=10, interval=300, initial_delay=None):
+        super().__init__(interval, interval if initial_delay is None else initial_delay)
+        self.processor = processor or DataProcessor()
+        self.registry = registry or default_registry
+        self.model_name = model_name
+        self.n_new_trees = n_new_trees
+        self.max_estimators = max_estimators
+        self.min_rows = min_rows
+
+    @property
+    def watermark(self):
+        meta = self.registry.metadata(self.model_name)
+        return meta.get('watermark', 0) if meta else 0
+
+    def run_once(self):
+        """Train on new batches; returns the number of rows used"""
+        batches = self.processor.fetch_batches_since(
+            self.watermark, FEATURE_COLUMNS + [TARGET_COLUMN]
+        )
+        rows = batches.dropna(subset=FEATURE_COLUMNS + [TARGET_COLUMN])
+        if len(rows) < self.min_rows:
+            # Leave the watermark alone until enough new rows accumulate
+            return 0
+
+        X = rows[FEATURE_COLUMNS].to_numpy(dtype=float)
+        y = rows[TARGET_COLUMN].to_numpy(dtype=float)
+
+        optimizer = copy.deepcopy(self.registry.load(self.model_name, ExtractionOptimizer))
+        optimizer.partial_train(X, y, self.n_new_trees, self.max_estimators)
+
+        self.registry.save(self.model_name, optimizer, X, y,
+                           watermark=int(batches['change_seq'].max()),
+                           n_estimators=len(optimizer.model.estimators_))
+        return len(rows)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def start_background_retraining(**kwargs):
+    """Start the process-wide retraining pipeline once and return it"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = RetrainingPipeline(**kwargs)
+        return _pipeline.start()
@@ -0,0 +1,121 @@
+"""
+Columnar Snapshot of Batch History
+Partitioned Parquet copy of the batches table for analytical reads
+"""
+
+import os
+import json
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+from utils.data_processor import DataProcessor, BATCH_COLUMNS, NUMERIC_COLUMNS
+
+PARTITION_COLUMNS = ['month', 'strain']
+
+# Fixed schema so every refresh writes compatible files
+SNAPSHOT_SCHEMA = pa.schema(
+    [(c, pa.float64() if c in NUMERIC_COLUMNS else pa.string())
+     for c in BATCH_COLUMNS if c != 'strain'] +
+    [('month', pa.string()), ('strain', pa.string())]
+)
+
+
+class BatchSnapshot:
+    """
+    Parquet snapshot of batches partitioned by month and strain
+
+    refresh() appends rows created since the last (created_at, rowid)
+    watermark, so each refresh costs only the new rows. Readers load just
+    the columns and partitions they ask for through memory-mapped files.
+
+    Rows changed in place by upserts keep their created_at and are not
+    re-exported; use rebuild() after bulk corrections.
+    """
+
+    def __init__(self, processor=None, root='data/snapshot', chunk_size=50_000):
+        self.processor = processor or DataProcessor()
+        self.root = root
+        self.chunk_size = chunk_size
+        self._watermark_path = os.path.join(root, '_watermark.json')
+        self._filesystem = fs.LocalFileSystem(use_mmap=True)
+
+    @property
+    def watermark(self):
+        if not os.path.exists(self._watermark_path):
+            return {'created_at': None, 'rowid': 0}
+        with open(self._watermark_path) as f:
+            return json.load(f)
+
+    def refresh(self):
+        """Export batches created since the watermark; returns rows written"""
+        os.makedirs(self.root, exist_ok=True)
+        watermark = self.watermark
+        written = 0
+        run_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+        while True:
+            batches = self.processor.fetch_batches_created_since(
+                watermark['created_at'], watermark['rowid'], limit=self.chunk_size
+            )
+            if batches.empty:
+                return written
+
+            last = batches.iloc[-1]
+            batches['month'] = batches['date'].astype('string').str[:7].fillna('unknown')
+            batches['strain'] = batches['strain'].fillna('unknown')
+            table = pa.Table.from_pandas(batches.drop(columns='rowid'), schema=SNAPSHOT_SCHEMA,
+                                         preserve_index=False)
+
+            ds.write_dataset(
+                table, self.root, format='parquet',
+                partitioning=PARTITION_COLUMNS, partitioning_flavor='hive',
+                basename_template=f"part-{run_id}-{written}-{{i}}.parquet",
+                existing_data_behavior='overwrite_or_ignore'
+            )
+            written += len(batches)
+
+            # Advance the watermark only after the chunk is on disk
+            watermark = {'created_at': last['created_at'], 'rowid': int(last['rowid'])}
+            tmp_path = self._watermark_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(watermark, f)
+            os.replace(tmp_path, self._watermark_path)
+
+    def rebuild(self):
+        """Drop the snapshot and export the full history again"""
+        if os.path.exists(self.root):
+            for entry in os.scandir(self.root):
+                if entry.is_dir():
+                    self._filesystem.delete_dir(os.path.abspath(entry.path))
+                else:
+                    os.remove(entry.path)
+        return self.refresh()
+
+    def read(self, columns=None, months=None, strains=None, filter=None):
+        """
+        Load a column-projected DataFrame from the snapshot
+
+        months / strains prune partitions; filter is an optional extra
+        pyarrow.dataset expression.
+        """
+        if not os.path.exists(self.root):
+            return SNAPSHOT_SCHEMA.empty_table().to_pandas()[columns or SNAPSHOT_SCHEMA.names]
+
+        dataset = ds.dataset(os.path.abspath(self.root), schema=SNAPSHOT_SCHEMA, format='parquet',
+                             partitioning='hive', filesystem=self._filesystem,
+                             exclude_invalid_files=True)
+        if months is not None:
+            filter = _and(filter, ds.field('month').isin(list(months)))
+        if strains is not None:
+            filter = _and(filter, ds.field('strain').isin(list(strains)))
+        return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+    def training_data(self, feature_columns, target_column):
+        """X, y arrays for model training, reading only the needed columns"""
+        df = self.read(feature_columns + [target_column]).dropna()
+        return df[feature_columns].to_numpy(), df[target_column].to_numpy()
+
+
+def _and(left, right):
+    return right if left is None else left & right